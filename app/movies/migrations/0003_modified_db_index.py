@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0002_auto_20220427_1141"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="filmwork",
+            name="modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="genre",
+            name="modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="person",
+            name="modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+NOTIFY_ETL_SQL = """
+CREATE OR REPLACE FUNCTION content.notify_etl_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb := to_jsonb(COALESCE(NEW, OLD));
+BEGIN
+    PERFORM pg_notify('etl_changes', jsonb_strip_nulls(jsonb_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', changed->'id',
+        'film_work_id', changed->'film_work_id'
+    ))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS film_work_notify_etl ON content.film_work;
+CREATE TRIGGER film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS person_notify_etl ON content.person;
+CREATE TRIGGER person_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.person
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS genre_notify_etl ON content.genre;
+CREATE TRIGGER genre_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.genre
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS person_film_work_notify_etl ON content.person_film_work;
+CREATE TRIGGER person_film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.person_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS genre_film_work_notify_etl ON content.genre_film_work;
+CREATE TRIGGER genre_film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.genre_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+"""
+
+DROP_NOTIFY_ETL_SQL = """
+DROP TRIGGER IF EXISTS film_work_notify_etl ON content.film_work;
+DROP TRIGGER IF EXISTS person_notify_etl ON content.person;
+DROP TRIGGER IF EXISTS genre_notify_etl ON content.genre;
+DROP TRIGGER IF EXISTS person_film_work_notify_etl ON content.person_film_work;
+DROP TRIGGER IF EXISTS genre_film_work_notify_etl ON content.genre_film_work;
+DROP FUNCTION IF EXISTS content.notify_etl_change();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0003_modified_db_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_ETL_SQL, DROP_NOTIFY_ETL_SQL),
+    ]
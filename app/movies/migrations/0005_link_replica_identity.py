@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# Deletes of link rows in the logical replication stream carry their film
+# and person/genre ids only with the full replica identity.
+REPLICA_IDENTITY_FULL_SQL = """
+ALTER TABLE content.person_film_work REPLICA IDENTITY FULL;
+ALTER TABLE content.genre_film_work REPLICA IDENTITY FULL;
+"""
+
+REPLICA_IDENTITY_DEFAULT_SQL = """
+ALTER TABLE content.person_film_work REPLICA IDENTITY DEFAULT;
+ALTER TABLE content.genre_film_work REPLICA IDENTITY DEFAULT;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0004_etl_notify_triggers"),
+    ]
+
+    operations = [
+        migrations.RunSQL(REPLICA_IDENTITY_FULL_SQL, REPLICA_IDENTITY_DEFAULT_SQL),
+    ]
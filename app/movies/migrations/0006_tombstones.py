@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# Deleted rows leave tombstones, so the ETL deletes their documents.
+TOMBSTONES_SQL = """
+CREATE TABLE IF NOT EXISTS content.tombstone (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    table_name text NOT NULL,
+    object_id uuid NOT NULL,
+    film_work_id uuid,
+    person_id uuid,
+    deleted timestamp with time zone NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS tombstone_deleted_idx ON content.tombstone (deleted, id);
+
+CREATE OR REPLACE FUNCTION content.record_tombstone() RETURNS trigger AS $$
+DECLARE
+    deleted_row jsonb := to_jsonb(OLD);
+BEGIN
+    INSERT INTO content.tombstone (table_name, object_id, film_work_id, person_id)
+    VALUES (
+        TG_TABLE_NAME,
+        OLD.id,
+        (deleted_row->>'film_work_id')::uuid,
+        (deleted_row->>'person_id')::uuid
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS film_work_tombstone ON content.film_work;
+CREATE TRIGGER film_work_tombstone AFTER DELETE ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS person_tombstone ON content.person;
+CREATE TRIGGER person_tombstone AFTER DELETE ON content.person
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS genre_tombstone ON content.genre;
+CREATE TRIGGER genre_tombstone AFTER DELETE ON content.genre
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS person_film_work_tombstone ON content.person_film_work;
+CREATE TRIGGER person_film_work_tombstone AFTER DELETE ON content.person_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS genre_film_work_tombstone ON content.genre_film_work;
+CREATE TRIGGER genre_film_work_tombstone AFTER DELETE ON content.genre_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+"""
+
+DROP_TOMBSTONES_SQL = """
+DROP TRIGGER IF EXISTS film_work_tombstone ON content.film_work;
+DROP TRIGGER IF EXISTS person_tombstone ON content.person;
+DROP TRIGGER IF EXISTS genre_tombstone ON content.genre;
+DROP TRIGGER IF EXISTS person_film_work_tombstone ON content.person_film_work;
+DROP TRIGGER IF EXISTS genre_film_work_tombstone ON content.genre_film_work;
+DROP FUNCTION IF EXISTS content.record_tombstone();
+DROP TABLE IF EXISTS content.tombstone;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0005_link_replica_identity"),
+    ]
+
+    operations = [
+        migrations.RunSQL(TOMBSTONES_SQL, DROP_TOMBSTONES_SQL),
+    ]
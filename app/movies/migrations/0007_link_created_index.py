@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0006_tombstones"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="personfilmwork",
+            index=models.Index(
+                fields=["created", "film_work"], name="person_film_work_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="genrefilmwork",
+            index=models.Index(
+                fields=["created", "film_work"], name="genre_film_work_created_idx"
+            ),
+        ),
+    ]
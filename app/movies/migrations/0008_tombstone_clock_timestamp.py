@@ -0,0 +1,23 @@
+from django.db import migrations
+
+# now() is the start of the transaction, so a long one could commit its
+# tombstones behind the checkpoint of the ETL. The time of the delete
+# itself is closer to the commit and is covered by the ETL overlap window.
+CLOCK_TIMESTAMP_SQL = """
+ALTER TABLE content.tombstone ALTER COLUMN deleted SET DEFAULT clock_timestamp();
+"""
+
+NOW_SQL = """
+ALTER TABLE content.tombstone ALTER COLUMN deleted SET DEFAULT now();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0007_link_created_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CLOCK_TIMESTAMP_SQL, NOW_SQL),
+    ]
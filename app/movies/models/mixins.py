@@ -14,7 +14,7 @@ class TimeStampedMixin(models.Model):
     """TimeStampedMixin class."""
 
     created = models.DateTimeField(auto_now_add=True)
-    modified = models.DateTimeField(auto_now=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta(object):
         """Meta class."""
@@ -123,6 +123,12 @@ class GenreFilmwork(UUIDMixin):
 
         db_table = 'content"."genre_film_work'
 
+        indexes = [
+            models.Index(
+                fields=["created", "film_work"], name="genre_film_work_created_idx"
+            ),
+        ]
+
 
 class Role(models.TextChoices):
     """Role choices container."""
@@ -149,6 +155,12 @@ class PersonFilmwork(UUIDMixin):
 
         db_table = 'content"."person_film_work'
 
+        indexes = [
+            models.Index(
+                fields=["created", "film_work"], name="person_film_work_created_idx"
+            ),
+        ]
+
         constraints = [
             models.UniqueConstraint(
                 fields=["film_work", "person", "role"],
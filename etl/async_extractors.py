@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Async extractors from the source database with asyncpg."""
+
+import asyncio
+import json
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, NoReturn, Optional
+from uuid import UUID
+
+import asyncpg
+
+from backoff import backoff_decorator
+from config import logger
+from extractors import get_checkpoint, parse_modified
+from metrics import observe_batch
+
+PARAM_RE = re.compile(r"%\((\w+)\)s")
+
+
+@lru_cache(maxsize=None)
+def convert_query(query: str) -> tuple:
+    """Convert a query with %(name)s parameters to $n ones of asyncpg."""
+    names = []
+
+    def replace(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return PARAM_RE.sub(replace, query), tuple(names)
+
+
+def bind(query: str, params: dict) -> list:
+    """Get asyncpg query and positional arguments for named parameters."""
+    query, names = convert_query(query)
+    return [query, *(params[name] for name in names)]
+
+
+def record_to_row(record: Any) -> dict:
+    """Convert asyncpg record to a row like the ones of psycopg2."""
+    return {
+        key: str(value) if isinstance(value, UUID) else value
+        for key, value in record.items()
+    }
+
+
+def get_async_checkpoint(state: Any, name: str, overlap: float = 0) -> dict:
+    """Get checkpoint with typed values, asyncpg does not cast strings."""
+    checkpoint = get_checkpoint(state, name, overlap)
+    checkpoint["modified"] = parse_modified(checkpoint["modified"])
+    return checkpoint
+
+
+async def abatches(records: AsyncIterator, batch_size: int) -> AsyncIterator:
+    """Group records of a cursor to batches of rows."""
+    rows_batch = []
+    async for record in records:
+        rows_batch.append(record_to_row(record))
+        if len(rows_batch) >= batch_size:
+            yield rows_batch
+            rows_batch = []
+    if rows_batch:
+        yield rows_batch
+
+
+async def init_connection(conn: Any) -> NoReturn:
+    await conn.set_type_codec(
+        "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+    )
+
+
+pools = {}
+
+
+async def get_async_pool(config: Any) -> Any:
+    """Get the asyncpg pool of the database in the config.
+
+    A pool which failed to open is forgotten, the next call tries again.
+    """
+    key = tuple(config.get_asyncpg_dict().items())
+    if key not in pools:
+        # The task is stored at once, so concurrent callers share one pool.
+        pools[key] = asyncio.ensure_future(
+            asyncpg.create_pool(
+                **config.get_asyncpg_dict(),
+                min_size=1,
+                max_size=config.db_pool_size,
+                init=init_connection,
+            )
+        )
+    future = pools[key]
+    try:
+        return await asyncio.shield(future)
+    except Exception:
+        if pools.get(key) is future:
+            del pools[key]
+        raise
+
+
+@asynccontextmanager
+async def async_conn_context(config: Any) -> AsyncIterator:
+    """Async context manager that borrows a connection from the pool."""
+    pool = await get_async_pool(config)
+    async with pool.acquire() as conn:
+        yield conn
+
+
+async def async_enrich_rows_batch(conn: Any, query: str, keys_batch: list) -> list:
+    """Get full rows for a batch of changed (id, modified) keys."""
+    modified = {row["id"]: row["modified"] for row in keys_batch}
+    records = await conn.fetch(*bind(query, {"ids": list(modified)}))
+    rows_batch = [
+        dict(row, modified=modified[row["id"]]) for row in map(record_to_row, records)
+    ]
+    rows_batch.sort(key=lambda row: (row["modified"], row["id"]))
+    return rows_batch
+
+
+@backoff_decorator(dependency="postgres")
+async def aiter_bulk_extractor(
+    name: str,
+    config: Any,
+    query: str,
+    batch_size: int,
+    state: Any,
+    enrich_query: Optional[str] = None,
+    params: Optional[dict] = None,
+) -> AsyncIterator:
+    """Get all data from DB, like `iter_bulk_extractor` does.
+
+    Rows are streamed through a cursor inside a transaction, prefetching
+    `config.itersize` rows at a time.
+    """
+    logger.info("Connection...")
+    async with async_conn_context(config) as conn:
+        async with conn.transaction():
+            cursor = conn.cursor(
+                *bind(
+                    query,
+                    {
+                        **get_async_checkpoint(state, name, config.watermark_overlap),
+                        **(params or {}),
+                    },
+                ),
+                prefetch=config.itersize,
+            )
+            async for rows_batch in abatches(cursor, batch_size):
+                if enrich_query:
+                    rows_batch = await async_enrich_rows_batch(
+                        conn, enrich_query, rows_batch
+                    )
+                observe_batch(name, rows_batch)
+                yield rows_batch
+
+
+@backoff_decorator(dependency="postgres")
+async def aiter_related_extractor(
+    config: Any, query: str, ids: list, batch_size: int
+) -> AsyncIterator:
+    """Get rows related to the given ids from DB."""
+    async with async_conn_context(config) as conn:
+        async with conn.transaction():
+            cursor = conn.cursor(*bind(query, {"ids": ids}), prefetch=config.itersize)
+            async for rows_batch in abatches(cursor, batch_size):
+                observe_batch("related", rows_batch)
+                yield rows_batch
+
+
+async def aiter_whole_groups(batches: AsyncIterator) -> AsyncIterator:
+    """Rebatch rows ordered by id, so rows of one id are never split."""
+    tail = []
+    async for rows_batch in batches:
+        rows_batch = tail + rows_batch
+        last_id = rows_batch[-1]["id"]
+        split = len(rows_batch)
+        while split and rows_batch[split - 1]["id"] == last_id:
+            split -= 1
+        tail = rows_batch[split:]
+        if split:
+            yield rows_batch[:split]
+    if tail:
+        yield tail
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Async loaders to the target database."""
+
+import asyncio
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Callable, NoReturn, Optional
+
+import elasticsearch
+
+from backoff import backoff_decorator
+from config import logger
+from loaders import (AdaptiveBulkSize, log_failed_items, retry_delay,
+                     split_bulk_items)
+from metrics import BULK_FAILED, count_rows, observe_bulk
+
+
+class AsyncBulkPool:
+    """
+    Общий пул bulk запросов к ES для async загрузчиков. Вместо потоков
+    держит задачи asyncio: не больше `es_workers` запросов в полёте
+    и ограниченную очередь за ними.
+    """
+
+    def __init__(
+        self, es: Any, config: Any, dead_letters: Optional[Any] = None
+    ) -> NoReturn:
+        self.es = es
+        self.config = config
+        self.dead_letters = dead_letters
+        self.in_flight = asyncio.Semaphore(config.es_workers)
+        self.slots = asyncio.Semaphore(config.es_workers + config.es_queue_size)
+        self.size = AdaptiveBulkSize(config)
+        self.max_actions = config.es_bulk_actions
+        self.tasks = set()
+
+    @backoff_decorator(dependency="elasticsearch")
+    async def request(self, entries: list) -> dict:
+        """Send bulk request and adapt bulk size to the response."""
+        body = b"".join(entries)
+        async with self.in_flight:
+            started = time.monotonic()
+            try:
+                response = await self.es.bulk(body=body)
+            except elasticsearch.TransportError as err:
+                if err.status_code == 429:
+                    self.size.rejected()
+                    BULK_FAILED.labels(429).inc(len(entries))
+                raise
+            observe_bulk(started, body, len(entries))
+        self.size.observe(response)
+        return response
+
+    async def send(self, entries: list) -> NoReturn:
+        """Send entries, retry rejected items and keep failed ones aside."""
+        for attempt in range(self.config.es_retries + 1):
+            response = await self.request(entries)
+            entries, failed = split_bulk_items(
+                entries, response, attempt < self.config.es_retries
+            )
+            self.fail(failed)
+            if not entries:
+                return
+            logger.info(f"Retrying {len(entries)} rejected bulk actions")
+            await asyncio.sleep(retry_delay(self.config, attempt))
+
+    def fail(self, failed: list) -> NoReturn:
+        """Send permanently failed actions to the dead letters."""
+        if not failed:
+            return
+        log_failed_items(failed)
+        if self.dead_letters is not None:
+            self.dead_letters.add(failed)
+
+    async def submit(self, entries: list) -> asyncio.Task:
+        """Submit bulk request, wait while the queue is full."""
+        await self.slots.acquire()
+        task = asyncio.create_task(self.send(entries))
+        self.tasks.add(task)
+        task.add_done_callback(self.release)
+        return task
+
+    def release(self, task: asyncio.Task) -> NoReturn:
+        self.tasks.discard(task)
+        self.slots.release()
+
+    async def close(self) -> NoReturn:
+        """Wait for bulk requests left by failed loaders."""
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class AsyncBulkLoader:
+    """
+    Async загрузчик одного пайплайна, работает как `BulkLoader`:
+    буфер действий, очередь запросов через общий пул и колбэки,
+    которые вызываются в порядке отправки.
+    """
+
+    def __init__(self, pool: AsyncBulkPool) -> NoReturn:
+        self.pool = pool
+        self.pending = deque()
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_callbacks = []
+
+    async def load(self, entries: list, entity: Optional[str] = None) -> NoReturn:
+        """Add encoded actions to the buffer, send it when the buffer is full.
+
+        Actions are counted as loaded for `entity` once they are in ES.
+        """
+        for entry in entries:
+            self.buffer.append(entry)
+            self.buffer_bytes += len(entry)
+            if (
+                self.buffer_bytes >= self.pool.size.target
+                or len(self.buffer) >= self.pool.max_actions
+            ):
+                await self.flush()
+        if entity is not None and entries:
+            self.then(partial(count_rows, entity, "loaded", len(entries)))
+
+    async def flush(self) -> NoReturn:
+        """Submit buffered actions, wait while the queue is full."""
+        if not self.buffer:
+            return
+        task = await self.pool.submit(self.buffer)
+        self.pending.append((task, self.buffer_callbacks))
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_callbacks = []
+        await self.collect()
+
+    def then(self, callback: Callable) -> NoReturn:
+        """Call callback when all actions loaded so far are in ES."""
+        if self.buffer:
+            self.buffer_callbacks.append(callback)
+        elif self.pending:
+            self.pending[-1][1].append(callback)
+        else:
+            callback()
+
+    async def collect(self, wait: bool = False) -> NoReturn:
+        """Run callbacks of finished bulk requests in submission order."""
+        while self.pending and (wait or self.pending[0][0].done()):
+            task, callbacks = self.pending.popleft()
+            await task
+            for callback in callbacks:
+                callback()
+
+    async def join(self) -> NoReturn:
+        """Send the buffer and wait for all bulk requests."""
+        await self.flush()
+        await self.collect(wait=True)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Async engine of the ETL, selected with ETL_ENGINE=asyncio."""
+
+import asyncio
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from typing import Any, NoReturn
+
+from elasticsearch import AsyncElasticsearch
+
+from async_extractors import (aiter_bulk_extractor, aiter_related_extractor,
+                              aiter_whole_groups, async_conn_context, bind,
+                              get_async_checkpoint)
+from async_loaders import AsyncBulkLoader, AsyncBulkPool
+from backoff import backoff_decorator
+from cdc import group_tombstones
+from config import Settings, logger
+from extractors import save_checkpoint
+from initiation import bulk_load_settings
+from queries import (query_films, query_films_by_ids, query_genres,
+                     query_person_films, query_person_films_by_person_ids,
+                     query_persons, query_prune_tombstones, query_tombstones)
+from runtime import (PROPAGATIONS, configuration, get_dead_letters,
+                     get_indices, get_schema_files, switch_aliases)
+from state import State
+from transformers import (PeopleRoles, encode_filmography, transform_deletes,
+                          transform_filmography, transform_films,
+                          transform_rows)
+
+
+@lru_cache(maxsize=None)
+def get_async_es() -> AsyncElasticsearch:
+    """Get the async ES client shared by all runs of the event loop."""
+    config = Settings()
+    return AsyncElasticsearch([config.es_address], maxsize=config.es_pool_size)
+
+
+async def propagate_to_films(
+    config: Any,
+    loader: AsyncBulkLoader,
+    query: str,
+    transformer: str,
+    row_bulk: list,
+    index_name: str,
+) -> int:
+    """Update denormalised fields of films related to the changed rows."""
+    total = 0
+    ids = [row["id"] for row in row_bulk]
+    async for films_bulk in aiter_related_extractor(
+        config, query, ids, config.batch_size
+    ):
+        await loader.load(
+            transform_rows(transformer, films_bulk, index_name, config.validate),
+            transformer,
+        )
+        total += len(films_bulk)
+    return total
+
+
+async def load_filmography(
+    config: Any, loader: AsyncBulkLoader, person_ids: list, index_name: str
+) -> int:
+    """Update filmography of the given persons.
+
+    Persons left without films get an empty filmography.
+    """
+    total = 0
+    without_films = set(person_ids)
+    async for rows_batch in aiter_whole_groups(
+        aiter_related_extractor(
+            config, query_person_films_by_person_ids, person_ids, config.batch_size
+        )
+    ):
+        entries = transform_filmography(rows_batch, index_name)
+        await loader.load(entries, "filmography")
+        total += len(entries)
+        without_films.difference_update(str(row["id"]) for row in rows_batch)
+    entries = [
+        encode_filmography(person_id, [], index_name) for person_id in without_films
+    ]
+    await loader.load(entries, "filmography")
+    return total + len(entries)
+
+
+async def load_entities(
+    config: Any,
+    state: State,
+    loader: AsyncBulkLoader,
+    indices: dict,
+    propagate: bool,
+    name: str,
+    query: str,
+) -> list:
+    """Genres or persons pipeline, like `main.load_genres`."""
+    total = 0
+    changed = []
+    async for row_bulk in aiter_bulk_extractor(
+        name, config, query, config.batch_size, state
+    ):
+        entries = transform_rows(name, row_bulk, indices[name], config.validate)
+        await loader.load(entries, name)
+        total += len(entries)
+        if propagate:
+            changed.append(row_bulk)
+        else:
+            loader.then(partial(save_checkpoint, state, name, row_bulk))
+    await loader.join()
+
+    logger.info(f"Done with {name}: ({total})")
+    return changed
+
+
+async def propagate_changes(
+    config: Any,
+    state: State,
+    loader: AsyncBulkLoader,
+    indices: dict,
+    name: str,
+    changed: list,
+) -> NoReturn:
+    """Update films of changed genres or persons, after the films pipeline."""
+    films_query, transformer = PROPAGATIONS[name]
+    total = 0
+    for row_bulk in changed:
+        total += await propagate_to_films(
+            config, loader, films_query, transformer, row_bulk, indices["films"]
+        )
+        loader.then(partial(save_checkpoint, state, name, row_bulk))
+    await loader.join()
+
+    logger.info(f"Done with films of changed {name}: ({total})")
+
+
+async def load_films(
+    config: Any,
+    state: State,
+    loader: AsyncBulkLoader,
+    indices: dict,
+    propagate: bool,
+    persons_loaded: asyncio.Task,
+) -> NoReturn:
+    """Films pipeline: films and filmography of their persons.
+
+    The async engine loads all films itself, shards are loaded by the
+    workers of the threads engine only.
+    """
+    total = 0
+    total_people = 0
+    people_roles = PeopleRoles() if propagate else None
+    async for row_bulk in aiter_bulk_extractor(
+        "films",
+        config,
+        query_films,
+        config.batch_size,
+        state,
+        query_films_by_ids,
+        {"shard": 0, "shards": 1},
+    ):
+        entries = transform_films(
+            row_bulk, indices["films"], people_roles, config.validate
+        )
+        await loader.load(entries, "films")
+        total += len(entries)
+        if propagate:
+            await persons_loaded
+            total_people += await load_filmography(
+                config, loader, people_roles.pop_new(), indices["persons"]
+            )
+        loader.then(partial(save_checkpoint, state, "films", row_bulk))
+    await loader.join()
+
+    logger.info(f"Done with films: ({total})")
+    logger.info(f"Done with filmography of persons of changed films: ({total_people})")
+
+
+async def load_all_filmography(
+    config: Any,
+    state: State,
+    loader: AsyncBulkLoader,
+    indices: dict,
+    persons_loaded: asyncio.Task,
+) -> NoReturn:
+    """Filmography pipeline: films of all persons, after persons are loaded."""
+    await persons_loaded
+    total = 0
+    async for row_bulk in aiter_whole_groups(
+        aiter_bulk_extractor(
+            "filmography", config, query_person_films, config.batch_size, state
+        )
+    ):
+        entries = transform_filmography(row_bulk, indices["persons"])
+        await loader.load(entries, "filmography")
+        total += len(entries)
+        loader.then(partial(save_checkpoint, state, "filmography", row_bulk))
+    await loader.join()
+
+    logger.info(f"Done with people filmography: ({total})")
+
+
+async def load_deletes(
+    config: Any, state: State, loader: AsyncBulkLoader, indices: dict
+) -> NoReturn:
+    """Deletes pipeline: delete documents of rows left as tombstones."""
+    total = 0
+    async for row_bulk in aiter_bulk_extractor(
+        "tombstones", config, query_tombstones, config.batch_size, state
+    ):
+        grouped = group_tombstones(row_bulk)
+        for name in ("films", "persons", "genres"):
+            await loader.load(
+                transform_deletes(grouped[name]["deleted"], indices[name]), "deletes"
+            )
+        await loader.join()
+        ids = list(grouped["films"]["changed"])
+        if ids:
+            async for films_bulk in aiter_related_extractor(
+                config, query_films_by_ids, ids, config.batch_size
+            ):
+                entries = transform_films(
+                    films_bulk, indices["films"], None, config.validate
+                )
+                await loader.load(entries, "films")
+        if grouped["filmography"]:
+            await load_filmography(
+                config, loader, list(grouped["filmography"]), indices["persons"]
+            )
+        total += len(row_bulk)
+        loader.then(partial(save_checkpoint, state, "tombstones", row_bulk))
+    await loader.join()
+    await prune_tombstones(config, state)
+
+    logger.info(f"Done with deletes: ({total})")
+
+
+@backoff_decorator(dependency="postgres")
+async def prune_tombstones(config: Any, state: State) -> NoReturn:
+    """Delete loaded tombstones, like `main.prune_tombstones`."""
+    checkpoint = get_async_checkpoint(state, "tombstones", config.watermark_overlap)
+    async with async_conn_context(config) as conn:
+        status = await conn.execute(*bind(query_prune_tombstones, checkpoint))
+    logger.info(f"Pruned tombstones: ({status.split()[-1]})")
+
+
+async def gather_or_cancel(*tasks: asyncio.Task) -> NoReturn:
+    """Wait for all tasks, cancel the rest when one of them fails."""
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+@backoff_decorator
+async def main(force: bool = False) -> NoReturn:
+    """The entrypoint coroutine.
+
+    Indices and state are managed like in the threads engine, the data
+    is loaded by asyncio tasks over asyncpg and AsyncElasticsearch.
+    """
+    config, state, es = configuration(force)
+
+    indices = get_indices(state, config)
+    rebuild = state.get("rebuild") == "1"
+    propagate = not rebuild
+    full_load = (
+        bulk_load_settings(es, get_schema_files(indices, config))
+        if rebuild
+        else nullcontext()
+    )
+
+    pool = AsyncBulkPool(get_async_es(), config, get_dead_letters())
+    try:
+        with full_load:
+            genres = asyncio.create_task(
+                load_entities(
+                    config,
+                    state,
+                    AsyncBulkLoader(pool),
+                    indices,
+                    propagate,
+                    "genres",
+                    query_genres,
+                )
+            )
+            persons = asyncio.create_task(
+                load_entities(
+                    config,
+                    state,
+                    AsyncBulkLoader(pool),
+                    indices,
+                    propagate,
+                    "persons",
+                    query_persons,
+                )
+            )
+            films = asyncio.create_task(
+                load_films(
+                    config, state, AsyncBulkLoader(pool), indices, propagate, persons
+                )
+            )
+            tasks = [genres, persons, films]
+            if rebuild:
+                tasks.append(
+                    asyncio.create_task(
+                        load_all_filmography(
+                            config, state, AsyncBulkLoader(pool), indices, persons
+                        )
+                    )
+                )
+            await gather_or_cancel(*tasks)
+            await gather_or_cancel(
+                *(
+                    asyncio.create_task(
+                        propagate_changes(
+                            config,
+                            state,
+                            AsyncBulkLoader(pool),
+                            indices,
+                            name,
+                            task.result(),
+                        )
+                    )
+                    for name, task in (("genres", genres), ("persons", persons))
+                )
+            )
+            await load_deletes(config, state, AsyncBulkLoader(pool), indices)
+    finally:
+        await pool.close()
+
+    if rebuild:
+        switch_aliases(state, config, es)
+    state.set("in_progress", 0)
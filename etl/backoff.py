@@ -4,11 +4,18 @@
 # @author: Aleksey Komissarov
 # @contact: ad3002@gmail.com
 
+import asyncio
+import inspect
 import logging
+import random
+import threading
 import time
+from collections import Counter
 from collections.abc import Callable
+from contextvars import ContextVar
 from datetime import datetime
 from functools import wraps
+from typing import NoReturn, Optional
 
 from config import handle_errors, logger
 
@@ -17,30 +24,308 @@ class BackoffFailException(Exception):
     pass
 
 
+class CircuitBreaker:
+    """
+    Предохранитель зависимости (Postgres, Redis, ES). После `threshold`
+    неудач подряд он размыкается, и вызовы ждут `reset_timeout` секунд.
+    Затем пропускается один пробный вызов: успех замыкает предохранитель,
+    неудача снова размыкает, остальные ждут его итога. Так переподключения
+    не идут толпой.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.prober = None
+        self.lock = threading.Lock()
+
+    def wait_time(self, caller: object = None) -> float:
+        """Get seconds to wait before a call is allowed.
+
+        The caller which gets 0 from an open circuit owns the probe, the
+        others have to ask again after waiting.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self.probing:
+                return min(self.reset_timeout, 1)
+            self.probing = True
+            self.prober = caller
+            return 0
+
+    def release(self, caller: object) -> NoReturn:
+        """Free the probe of the caller which neither succeeded nor failed."""
+        with self.lock:
+            if self.probing and self.prober is caller:
+                self.probing = False
+                self.prober = None
+
+    def success(self) -> NoReturn:
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit of {self.name} is closed")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            self.prober = None
+
+    def failure(self) -> NoReturn:
+        with self.lock:
+            self.failures += 1
+            if self.probing or (
+                self.opened_at is None and self.failures >= self.threshold
+            ):
+                if self.opened_at is None:
+                    logger.error(f"Circuit of {self.name} is open")
+                    retry_stats[(self.name, "circuit_opened")] += 1
+                self.opened_at = time.monotonic()
+            self.probing = False
+            self.prober = None
+
+
+BREAKERS = {
+    name: CircuitBreaker(name) for name in ("postgres", "redis", "elasticsearch")
+}
+
+# Retries, failures and circuit openings by (dependency, event).
+retry_stats = Counter()
+
+# Breakers whose probe is held by the current thread or task. Calls nested
+# in the probe go through, they can't wait for the call they are part of.
+probes: ContextVar = ContextVar("probes", default=frozenset())
+
+
+class Retry:
+    """State of retries of one call: attempts, delays and the time budget."""
+
+    def __init__(
+        self,
+        name: str,
+        dependency,
+        initial,
+        factor,
+        max_timeout,
+        max_tries,
+        max_time,
+        logger,
+    ):
+        self.name = name
+        self.logger = logger
+        self.dependency = dependency or "other"
+        self.breaker = BREAKERS.get(dependency)
+        self.initial = initial
+        self.factor = factor
+        self.max_timeout = max_timeout
+        self.max_tries = max_tries
+        self.deadline = time.monotonic() + max_time if max_time else None
+        self.attempts = 0
+        self.probe = False
+
+    def before(self) -> float:
+        """Get seconds to wait for the circuit before the next attempt."""
+        if self.breaker is None or self.breaker in probes.get():
+            return 0
+        wait = self.breaker.wait_time(self)
+        if wait:
+            self.check_budget(wait)
+        elif self.breaker.prober is self:
+            self.probe = True
+            probes.set(probes.get() | {self.breaker})
+        return wait
+
+    def wait(self) -> NoReturn:
+        """Sleep until the circuit lets the attempt through."""
+        wait = self.before()
+        while wait:
+            time.sleep(wait)
+            wait = self.before()
+
+    async def async_wait(self) -> NoReturn:
+        """Sleep like `wait` without blocking the event loop."""
+        wait = self.before()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.before()
+
+    def release(self) -> NoReturn:
+        """Free the probe of an attempt cancelled or given up without retries."""
+        if self.breaker is not None:
+            self.breaker.release(self)
+            self.leave_probe()
+
+    def leave_probe(self) -> NoReturn:
+        """Stop letting nested calls through once the probe is over."""
+        if self.probe:
+            self.probe = False
+            probes.set(probes.get() - {self.breaker})
+
+    def success(self) -> NoReturn:
+        """Reset attempts, a generator may fail again much later."""
+        self.attempts = 0
+        if self.breaker is not None:
+            self.breaker.success()
+            self.leave_probe()
+
+    def failed(self, err: Exception) -> float:
+        """Count the failure and get the delay before the next attempt.
+
+        Delays grow as `initial * factor**attempt` up to `max_timeout`,
+        with full jitter above `initial`.
+        """
+        handle_errors(err)
+        if self.breaker is not None:
+            self.breaker.failure()
+            self.leave_probe()
+        retry_stats[(self.dependency, "failures")] += 1
+        self.attempts += 1
+        if self.attempts >= self.max_tries:
+            self.give_up("Too many attempts in a backoff decorator")
+        cap = min(self.initial * self.factor ** (self.attempts - 1), self.max_timeout)
+        delay = random.uniform(self.initial, max(cap, self.initial))
+        self.check_budget(delay)
+        retry_stats[(self.dependency, "retries")] += 1
+        self.logger.error(
+            f"Backoff attempt {self.attempts} of {self.name} failed, "
+            f"retry in {delay:.2f}s, {err}"
+        )
+        return delay
+
+    def check_budget(self, delay: float) -> NoReturn:
+        if self.deadline is not None and time.monotonic() + delay > self.deadline:
+            self.give_up("Time budget of a backoff decorator is spent")
+
+    def give_up(self, message: str) -> NoReturn:
+        self.logger.error(f"{message} ({self.name})")
+        retry_stats[(self.dependency, "give_ups")] += 1
+        raise BackoffFailException(message)
+
+
 def backoff_decorator(
-    func: Callable, initial=0.1, factor=2, max_timeout=3, max_tries=10, logger=logger
+    func: Optional[Callable] = None,
+    *,
+    dependency: Optional[str] = None,
+    initial: float = 0.1,
+    factor: float = 2,
+    max_timeout: float = 3,
+    max_tries: int = 10,
+    max_time: Optional[float] = None,
+    giveup: tuple = (),
+    logger: logging.Logger = logger,
 ) -> Callable:
-    """Backoff functional decorator."""
-
-    @wraps(func)
-    def inner(*args, **kwargs):
-        timeout = initial
-        attempts = 0
-        while True:
-            try:
-                return func(*args, **kwargs)
-            except Exception as err:
-                handle_errors(err)
-                time.sleep(timeout)
-                timeout = min(initial * (attempts**factor), max_timeout)
-                logger.error(f"Backoff attempt fail with timeout {timeout}, {err}")
-                attempts += 1
-                continue
-            finally:
-                if attempts == max_tries:
-                    logger.error("Too many attempts in a backoff decorator")
-                    raise BackoffFailException(
-                        "Too many attempts in a backoff decorator"
-                    )
+    """Backoff functional decorator.
+
+    Works for plain functions, generators, coroutines and async
+    generators. A failed generator is called again, so it should start
+    from its own checkpoint. Calls of a `dependency` go through its
+    circuit breaker. Exceptions in `giveup` are raised without retries.
+    Can be used bare or with options:
+
+        @backoff_decorator(dependency="postgres", max_time=60)
+    """
+    options = (dependency, initial, factor, max_timeout, max_tries, max_time, logger)
+    if func is None:
+        return lambda func: backoff_decorator(
+            func,
+            dependency=dependency,
+            initial=initial,
+            factor=factor,
+            max_timeout=max_timeout,
+            max_tries=max_tries,
+            max_time=max_time,
+            giveup=giveup,
+            logger=logger,
+        )
+
+    if inspect.isasyncgenfunction(func):
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            retry = Retry(func.__qualname__, *options)
+            while True:
+                await retry.async_wait()
+                try:
+                    async for item in func(*args, **kwargs):
+                        retry.success()
+                        yield item
+                except giveup:
+                    raise
+                except Exception as err:
+                    await asyncio.sleep(retry.failed(err))
+                    continue
+                else:
+                    retry.success()
+                    return
+                finally:
+                    retry.release()
+
+    elif inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            retry = Retry(func.__qualname__, *options)
+            while True:
+                await retry.async_wait()
+                try:
+                    result = await func(*args, **kwargs)
+                except giveup:
+                    raise
+                except Exception as err:
+                    await asyncio.sleep(retry.failed(err))
+                    continue
+                else:
+                    retry.success()
+                    return result
+                finally:
+                    retry.release()
+
+    elif inspect.isgeneratorfunction(func):
+
+        @wraps(func)
+        def inner(*args, **kwargs):
+            retry = Retry(func.__qualname__, *options)
+            while True:
+                retry.wait()
+                try:
+                    for item in func(*args, **kwargs):
+                        retry.success()
+                        yield item
+                except giveup:
+                    raise
+                except Exception as err:
+                    time.sleep(retry.failed(err))
+                    continue
+                else:
+                    retry.success()
+                    return
+                finally:
+                    retry.release()
+
+    else:
+
+        @wraps(func)
+        def inner(*args, **kwargs):
+            retry = Retry(func.__qualname__, *options)
+            while True:
+                retry.wait()
+                try:
+                    result = func(*args, **kwargs)
+                except giveup:
+                    raise
+                except Exception as err:
+                    time.sleep(retry.failed(err))
+                    continue
+                else:
+                    retry.success()
+                    return result
+                finally:
+                    retry.release()
 
     return inner
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Change data capture from a logical replication slot with wal2json."""
+
+import json
+import select
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, NoReturn
+
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import LogicalReplicationConnection
+
+from backoff import backoff_decorator
+from config import logger
+
+CDC_TABLES = (
+    "film_work",
+    "person",
+    "genre",
+    "person_film_work",
+    "genre_film_work",
+    "tombstone",
+)
+# Seconds between status updates to the server while there are no changes.
+FEEDBACK_INTERVAL = 10
+ENTITY_TABLES = {"film_work": "films", "person": "persons", "genre": "genres"}
+# Row changes, truncates ("T") and messages ("M") carry no rows to load.
+ROW_ACTIONS = ("I", "U", "D")
+
+
+@contextmanager
+def replication_context(config: Any) -> Iterator:
+    """Context manager with a replication cursor to the source database."""
+    conn = psycopg2.connect(
+        **config.get_psycopg_dict(), connection_factory=LogicalReplicationConnection
+    )
+    try:
+        yield conn.cursor()
+    finally:
+        conn.close()
+
+
+def create_slot(config: Any) -> NoReturn:
+    """Create the replication slot unless it exists.
+
+    Changes are kept by the slot from this moment on, so it is created
+    before the initial load.
+    """
+    with replication_context(config) as cursor:
+        try:
+            cursor.create_replication_slot(config.cdc_slot, output_plugin="wal2json")
+        except psycopg2.errors.DuplicateObject:
+            return
+        logger.info(f"Replication slot {config.cdc_slot} created")
+
+
+@backoff_decorator(dependency="postgres", max_timeout=10, max_tries=30)
+def iter_changes(config: Any, start_lsn: int = 0) -> Iterator:
+    """Get batches of (changes, lsn) from the replication slot.
+
+    Changes come one per message (wal2json format 2) and are batched
+    like notifications: until `config.listen_debounce` ms of silence,
+    but not longer than `config.listen_max_delay` ms. `lsn` is confirmed
+    to the slot when the next batch is requested, after the caller has
+    loaded this one. A lost connection is opened again, the slot resumes
+    from the last confirmed LSN, so an unconfirmed batch comes again.
+    """
+    with replication_context(config) as cursor:
+        cursor.start_replication(
+            slot_name=config.cdc_slot,
+            decode=True,
+            start_lsn=start_lsn,
+            options={
+                "format-version": "2",
+                "include-transaction": "false",
+                "add-tables": ",".join(f"content.{table}" for table in CDC_TABLES),
+            },
+        )
+        logger.info(f"Streaming changes from {config.cdc_slot}")
+
+        changes = []
+        lsn = start_lsn
+        deadline = None
+        while True:
+            message = cursor.read_message()
+            if message is not None:
+                changes.append(json.loads(message.payload))
+                lsn = message.data_start
+                if deadline is None:
+                    deadline = time.monotonic() + config.listen_max_delay / 1000
+                if time.monotonic() < deadline:
+                    continue
+            elif changes:
+                timeout = min(
+                    config.listen_debounce / 1000, deadline - time.monotonic()
+                )
+                if timeout > 0 and select.select([cursor], [], [], timeout)[0]:
+                    continue
+            else:
+                cursor.send_feedback()
+                select.select([cursor], [], [], FEEDBACK_INTERVAL)
+                continue
+            yield changes, lsn
+            cursor.send_feedback(flush_lsn=lsn)
+            changes = []
+            deadline = None
+
+
+def change_values(change: dict) -> dict:
+    """Get column values of the change, old ones for deletes."""
+    if change["action"] == "D":
+        columns = change.get("identity", [])
+    else:
+        columns = change.get("columns", [])
+    return {column["name"]: column["value"] for column in columns}
+
+
+def group_changes(changes: list) -> dict:
+    """Group changes to ids to load and to delete by entity.
+
+    Changes of the link tables reload their films, and filmography of
+    their persons. Link rows need REPLICA IDENTITY FULL, so deletes
+    carry their film and person ids. Truncates and messages are skipped.
+    Ids of new tombstones are kept apart, their deletes come in the
+    stream too, so the tombstones can be dropped once loaded.
+    """
+    grouped = {
+        name: {"changed": set(), "deleted": set()} for name in ENTITY_TABLES.values()
+    }
+    filmography = set()
+    tombstones = set()
+    for change in changes:
+        if change["action"] not in ROW_ACTIONS:
+            if change["action"] == "T":
+                logger.warning(f"Truncate of {change['table']} is not loaded")
+            continue
+        values = change_values(change)
+        if change["table"] == "tombstone":
+            if change["action"] == "I":
+                tombstones.add(values["id"])
+        elif change["table"] in ENTITY_TABLES:
+            entity = grouped[ENTITY_TABLES[change["table"]]]
+            if change["action"] == "D":
+                entity["changed"].discard(values["id"])
+                entity["deleted"].add(values["id"])
+            else:
+                entity["deleted"].discard(values["id"])
+                entity["changed"].add(values["id"])
+        elif "film_work_id" in values:
+            grouped["films"]["changed"].add(values["film_work_id"])
+            if "person_id" in values:
+                filmography.add(values["person_id"])
+
+    for entity in grouped.values():
+        entity["changed"] -= entity["deleted"]
+    grouped["filmography"] = filmography - grouped["persons"]["deleted"]
+    grouped["tombstones"] = tombstones
+    return grouped
+
+
+def group_tombstones(rows: list) -> dict:
+    """Group tombstone rows like deletes of the replication stream."""
+    return group_changes(
+        [
+            {
+                "action": "D",
+                "table": row["table_name"],
+                "identity": [
+                    {"name": "id", "value": str(row["object_id"])},
+                    *(
+                        {"name": key, "value": str(row[key])}
+                        for key in ("film_work_id", "person_id")
+                        if row[key]
+                    ),
+                ],
+            }
+            for row in rows
+        ]
+    )
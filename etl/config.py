@@ -28,8 +28,25 @@ class Settings:
     host: str = os.environ.get("SQL_HOST", "127.0.0.1")
     port: int = os.environ.get("SQL_PORT", 5432)
     batch_size: int = 100
+    validate: bool = os.environ.get("ETL_VALIDATE", "0") == "1"
+    itersize: int = int(os.environ.get("DB_ITERSIZE", 2000))
+    db_pool_size: int = int(os.environ.get("DB_POOL_SIZE", 10))
+    watermark_overlap: float = float(os.environ.get("ETL_WATERMARK_OVERLAP", 60))
 
     es_address: str = os.getenv("ELASTIC_ADDRESS")
+    es_workers: int = int(os.environ.get("ELASTIC_WORKERS", 4))
+    es_pool_size: int = int(os.environ.get("ELASTIC_POOL_SIZE", 10))
+    es_queue_size: int = int(os.environ.get("ELASTIC_QUEUE_SIZE", 8))
+    es_bulk_bytes: int = int(os.environ.get("ELASTIC_BULK_BYTES", 5 * 2**20))
+    es_bulk_min_bytes: int = int(os.environ.get("ELASTIC_BULK_MIN_BYTES", 2**18))
+    es_bulk_max_bytes: int = int(os.environ.get("ELASTIC_BULK_MAX_BYTES", 20 * 2**20))
+    es_bulk_actions: int = int(os.environ.get("ELASTIC_BULK_ACTIONS", 5000))
+    es_bulk_took: int = int(os.environ.get("ELASTIC_BULK_TOOK_MS", 1000))
+    es_retries: int = int(os.environ.get("ELASTIC_ITEM_RETRIES", 5))
+    es_retry_delay: float = float(os.environ.get("ELASTIC_RETRY_DELAY", 0.5))
+    es_retry_max_delay: float = float(os.environ.get("ELASTIC_RETRY_MAX_DELAY", 30))
+    dead_letter_key: str = os.environ.get("ETL_DEAD_LETTER_KEY", "etl:dead_letters")
+    dead_letter_size: int = int(os.environ.get("ETL_DEAD_LETTER_SIZE", 10000))
 
     es_scheme_films: str = os.getenv("ELASTIC_SCHEME_FILMS")
     es_json_file_films: os.PathLike = os.environ.get("ELASTIC_JSON_FILE_FILMS")
@@ -44,6 +61,21 @@ class Settings:
     redis_port: int = os.getenv("REDIS_PORT")
     redis_host: str = os.getenv("REDIS_HOST")
 
+    lease_key: str = os.environ.get("ETL_LEASE_KEY", "etl:lease")
+    lease_ttl: int = int(os.environ.get("ETL_LEASE_TTL_MS", 10000))
+    lease_retry: float = float(os.environ.get("ETL_LEASE_RETRY", 1))
+
+    role: str = os.environ.get("ETL_ROLE", "main")
+    film_shards: int = int(os.environ.get("ETL_FILM_SHARDS", 1))
+    engine: str = os.environ.get("ETL_ENGINE", "threads")
+    mode: str = os.environ.get("ETL_MODE", "incremental")
+    listen_channel: str = os.environ.get("ETL_LISTEN_CHANNEL", "etl_changes")
+    listen_debounce: int = int(os.environ.get("ETL_LISTEN_DEBOUNCE_MS", 500))
+    listen_max_delay: int = int(os.environ.get("ETL_LISTEN_MAX_DELAY_MS", 5000))
+    listen_idle: float = float(os.environ.get("ETL_LISTEN_IDLE", 300))
+    cdc_slot: str = os.environ.get("ETL_CDC_SLOT", "etl_cdc")
+    metrics_port: int = int(os.environ.get("ETL_METRICS_PORT", 8000))
+
     def get_psycopg_dict(self) -> dict:
         """Get subset of settings for psycopg connection."""
         return {
@@ -54,6 +86,16 @@ class Settings:
             "port": self.port,
         }
 
+    def get_asyncpg_dict(self) -> dict:
+        """Get subset of settings for asyncpg connection."""
+        return {
+            "database": self.dbname,
+            "user": self.user,
+            "password": self.password,
+            "host": self.host,
+            "port": int(self.port),
+        }
+
     def get_redis_dict(self) -> dict:
         """Get redis connection dict."""
         return {
@@ -73,21 +115,15 @@ logging.basicConfig(
 
 logger = logging.getLogger()
 
+# Checkpoint of an entity which has not loaded any rows yet.
+DEFAULT_MODIFIED = "1900-01-01 01:00:00"
+DEFAULT_ID = "00000000-0000-0000-0000-000000000000"
+
 
 def handle_errors(err: Exception) -> NoReturn:
     """Handle errors for sqlite3."""
-    logger.error("Error: %s" % (" ".join(err.args)))
+    logger.error("Error: %s" % (err,))
     logger.error("Exception class is: %s" % err.__class__)
     logger.error("Traceback: ")
     exc_type, exc_value, exc_tb = sys.exc_info()
     logger.error(traceback.format_exception(exc_type, exc_value, exc_tb))
-
-
-def check_pid(pid: int) -> bool:
-    """Check For the existence of a unix pid."""
-    try:
-        os.kill(pid, 0)
-    except OSError:
-        return False
-    else:
-        return True
@@ -4,57 +4,248 @@
 # @author: Aleksey Komissarov
 # @contact: ad3002@gmail.com
 
-import datetime
 import sys
+import threading
 import traceback
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Iterator, NoReturn, Tuple
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Iterator, NoReturn, Optional, Tuple
 
 import psycopg2
 from psycopg2.extras import DictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
-from config import logger
+from config import DEFAULT_ID, DEFAULT_MODIFIED, logger
+from metrics import observe_batch
 
 
 def handle_psycopg2_errors(err: Exception) -> NoReturn:
     """Handle errors for psycopg2."""
-    logger.error("psycopg2 error: %s" % (" ".join(err.args)))
-    logger.error("Exception class is: ", err.__class__)
+    logger.error("psycopg2 error: %s" % (err,))
+    logger.error("Exception class is: %s" % err.__class__)
     logger.error("psycopg2 traceback: ")
     exc_type, exc_value, exc_tb = sys.exc_info()
     logger.error(traceback.format_exception(exc_type, exc_value, exc_tb))
-    sys.exit(11)
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений с Postgres, общий для всех экстракторов
+    и всех запусков ETL. Если свободных соединений нет, экстрактор ждёт,
+    а не получает ошибку пула.
+    """
+
+    def __init__(self, config: Any) -> NoReturn:
+        self.pool = ThreadedConnectionPool(
+            1,
+            config.db_pool_size,
+            **config.get_psycopg_dict(),
+            cursor_factory=DictCursor,
+        )
+        self.slots = threading.BoundedSemaphore(config.db_pool_size)
+
+    def getconn(self) -> Any:
+        self.slots.acquire()
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn: Any, close: bool = False) -> NoReturn:
+        """Return the connection, closing it if it is broken."""
+        try:
+            self.pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self.slots.release()
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(config: Any) -> ConnectionPool:
+    """Get the connection pool of the database in the config."""
+    key = tuple(config.get_psycopg_dict().items())
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(config)
+        return pools[key]
+
+
+def connect(config: Any) -> Any:
+    """Open a connection outside of the pool."""
+    try:
+        return psycopg2.connect(**config.get_psycopg_dict(), cursor_factory=DictCursor)
+    except psycopg2.OperationalError as err:
+        handle_psycopg2_errors(err)
+        raise
 
 
 @contextmanager
 def conn_context(config: dataclass) -> Iterator:
-    """Context manager that connect to both databases."""
+    """Context manager that borrows a connection from the pool.
+
+    The transaction is rolled back when the connection is returned,
+    which also closes named cursors. Connections that failed are
+    closed, the pool opens new ones instead.
+    """
     try:
-        conn = psycopg2.connect(**config.get_psycopg_dict(), cursor_factory=DictCursor)
+        conn = get_pool(config).getconn()
     except psycopg2.OperationalError as err:
         handle_psycopg2_errors(err)
-    yield conn
-    conn.close()
+        raise
+    broken = False
+    try:
+        yield conn
+    except psycopg2.Error:
+        broken = True
+        raise
+    finally:
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        get_pool(config).putconn(conn, close=broken)
+
+
+def parse_modified(value: Any) -> datetime:
+    """Get aware datetime of a saved or selected `modified` value."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def get_checkpoint(state: Any, name: str, overlap: float = 0) -> dict:
+    """Get the (modified, id) keyset of the last loaded row.
+
+    With `overlap` seconds the keyset is moved back, so rows committed
+    late with an older `modified` (long transactions, clock skew of the
+    writers) are loaded by the next run instead of being skipped.
+    Id-only keysets, like the filmography one, never get a `modified`
+    past the default and are kept as they are.
+    """
+    checkpoint = {
+        "modified": state.get(f"last_bulk_extractor_{name}") or DEFAULT_MODIFIED,
+        "id": state.get(f"last_bulk_extractor_{name}_id") or DEFAULT_ID,
+    }
+    if overlap and checkpoint["modified"] != DEFAULT_MODIFIED:
+        modified = parse_modified(checkpoint["modified"])
+        checkpoint["modified"] = str(modified - timedelta(seconds=overlap))
+        checkpoint["id"] = DEFAULT_ID
+    return checkpoint
+
+
+def save_checkpoint(state: Any, name: str, rows_batch: list) -> NoReturn:
+    """Save the keyset of the last row of a successfully loaded batch.
+
+    Rows read again in the overlap window never move the checkpoint back.
+    """
+    last_row = rows_batch[-1]
+    checkpoint = {f"last_bulk_extractor_{name}_id": last_row["id"]}
+    if "modified" in last_row:
+        saved = get_checkpoint(state, name)
+        if (parse_modified(last_row["modified"]), str(last_row["id"])) <= (
+            parse_modified(saved["modified"]),
+            saved["id"],
+        ):
+            return
+        checkpoint[f"last_bulk_extractor_{name}"] = last_row["modified"]
+    state.update(checkpoint)
+
+
+def enrich_rows_batch(conn: Any, query: str, keys_batch: list) -> list:
+    """Get full rows for a batch of changed (id, modified) keys.
+
+    The rows keep the keyset order of `keys_batch`, so the checkpoint of
+    an enriched batch is the same as the one of the keys batch.
+    """
+    modified = {row["id"]: row["modified"] for row in keys_batch}
+    cursor = conn.cursor()
+    cursor.execute(query, {"ids": list(modified)})
+    rows_batch = [dict(row, modified=modified[row["id"]]) for row in cursor]
+    cursor.close()
+    rows_batch.sort(key=lambda row: (row["modified"], row["id"]))
+    return rows_batch
 
 
 def iter_bulk_extractor(
-    name: str, config: Any, query: str, batch_size: int, state: Any
+    name: str,
+    config: Any,
+    query: str,
+    batch_size: int,
+    state: Any,
+    enrich_query: Optional[str] = None,
+    params: Optional[dict] = None,
 ) -> Iterator:
-    """Get all data from DB."""
+    """Get all data from DB.
+
+    Rows are streamed through a server-side (named) cursor, so only
+    `config.itersize` rows are held on the client at a time. The query
+    is ordered by (modified, id) and starts right after the last saved
+    checkpoint, the caller saves a new one after each loaded batch.
+
+    With `enrich_query` the main query only finds changed ids, and each
+    batch of them is turned into full rows by `enrich_query`. Extra query
+    parameters are given in `params`.
+    """
     logger.info("Connection...")
     with conn_context(config) as conn:
 
-        cursor = conn.cursor()
-        query = query % state.get(f"last_bulk_extractor_{name}")
-
-        cursor.execute(query)
-        state.set(
-            f"last_bulk_extractor_{name}",
-            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        cursor = conn.cursor(name=f"iter_bulk_extractor_{name}")
+        cursor.itersize = config.itersize
+        cursor.execute(
+            query,
+            {
+                **get_checkpoint(state, name, config.watermark_overlap),
+                **(params or {}),
+            },
         )
+
+        while True:
+            rows_batch = list(islice(cursor, batch_size))
+            if not rows_batch:
+                break
+            if enrich_query:
+                rows_batch = enrich_rows_batch(conn, enrich_query, rows_batch)
+            observe_batch(name, rows_batch)
+            yield rows_batch
+
+
+def iter_related_extractor(
+    name: str, config: Any, query: str, ids: list, batch_size: int
+) -> Iterator:
+    """Get rows related to the given ids from DB."""
+    with conn_context(config) as conn:
+
+        cursor = conn.cursor(name=f"iter_related_extractor_{name}")
+        cursor.itersize = config.itersize
+        cursor.execute(query, {"ids": ids})
+
         while True:
-            rows_batch = cursor.fetchmany(batch_size)
+            rows_batch = list(islice(cursor, batch_size))
             if not rows_batch:
                 break
+            observe_batch("related", rows_batch)
             yield rows_batch
+
+
+def iter_whole_groups(batches: Iterator) -> Iterator:
+    """Rebatch rows ordered by id, so rows of one id are never split."""
+    tail = []
+    for rows_batch in batches:
+        rows_batch = tail + rows_batch
+        last_id = rows_batch[-1]["id"]
+        split = len(rows_batch)
+        while split and rows_batch[split - 1]["id"] == last_id:
+            split -= 1
+        tail = rows_batch[split:]
+        if split:
+            yield rows_batch[:split]
+    if tail:
+        yield tail
@@ -6,16 +6,19 @@
 
 import json
 import os
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterator
 
 import elasticsearch
 
 from backoff import backoff_decorator
 from config import Settings, logger
 
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
 
-@backoff_decorator
+
+@backoff_decorator(dependency="elasticsearch")
 def create_index(es: Any, json_file_name: str, index_name: str) -> dict:
     """Create index according to given json file"""
 
@@ -30,3 +33,74 @@ def create_index(es: Any, json_file_name: str, index_name: str) -> dict:
     response = es.indices.create(index=index_name, body=data)
     logger.info(f"Done.")
     return response
+
+
+@backoff_decorator(dependency="elasticsearch")
+def create_versioned_index(es: Any, json_file_name: str, alias: str) -> str:
+    """Create the next version of the index behind the alias."""
+    versions = [
+        int(index_name.rsplit("_v", 1)[1])
+        for index_name in es.indices.get(index=f"{alias}_v*")
+    ]
+    index_name = f"{alias}_v{max(versions, default=0) + 1}"
+    create_index(es, json_file_name, index_name)
+    return index_name
+
+
+@backoff_decorator(dependency="elasticsearch")
+def switch_alias(es: Any, alias: str, index_name: str) -> dict:
+    """Atomically point the alias to the index and drop older versions."""
+    actions = [{"add": {"index": index_name, "alias": alias}}]
+    if es.indices.exists_alias(name=alias):
+        for old_index_name in es.indices.get_alias(name=alias):
+            if old_index_name != index_name:
+                actions.append({"remove": {"index": old_index_name, "alias": alias}})
+    elif es.indices.exists(index=alias):
+        # A plain index created before the aliases were introduced.
+        actions.append({"remove_index": {"index": alias}})
+
+    logger.info(f"Switching alias ({alias}) to ({index_name}) in ES")
+    response = es.indices.update_aliases(body={"actions": actions})
+
+    for old_index_name in es.indices.get(index=f"{alias}_v*"):
+        if old_index_name != index_name:
+            logger.info(f"Deleting old index ({old_index_name}) in ES")
+            es.indices.delete(index=old_index_name, ignore=[400, 404])
+    return response
+
+
+def get_schema_settings(json_file_name: str, names: list) -> dict:
+    """Get given settings of the index schema, None for the defaults."""
+    with open(json_file_name) as fh:
+        settings = json.load(fh).get("settings", {})
+    return {name: settings.get(name) for name in names}
+
+
+@backoff_decorator(dependency="elasticsearch")
+def put_index_settings(es: Any, index_name: str, settings: dict) -> dict:
+    """Update dynamic settings of the index."""
+    return es.indices.put_settings(index=index_name, body={"index": settings})
+
+
+@contextmanager
+def bulk_load_settings(es: Any, indices: list) -> Iterator:
+    """Disable refresh and replicas of the (index, json file) indices for a full load.
+
+    Settings of the schemas are restored and the indices are refreshed once
+    at the end. They don't come from the indices, which keep the bulk load
+    settings when a killed rebuild is resumed.
+    """
+    saved = {}
+    for index_name, json_file_name in indices:
+        saved[index_name] = get_schema_settings(
+            json_file_name, list(BULK_LOAD_SETTINGS)
+        )
+        logger.info(f"Bulk load settings for ({index_name}) in ES")
+        put_index_settings(es, index_name, BULK_LOAD_SETTINGS)
+    try:
+        yield
+    finally:
+        for index_name, settings in saved.items():
+            logger.info(f"Restoring settings for ({index_name}) in ES")
+            put_index_settings(es, index_name, settings)
+            es.indices.refresh(index=index_name)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Singleton lease in Redis."""
+
+import threading
+import time
+from typing import Any, NoReturn, Optional
+
+from config import logger
+
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLostError(Exception):
+    pass
+
+
+class RedisLease:
+    """
+    Аренда в Redis, которая позволяет работать только одному экземпляру ETL.
+    Аренда берётся через SET NX PX и продлевается в фоновом потоке.
+    Каждая аренда получает возрастающий токен, по которому хранилище
+    проверяет, что состояние пишет текущий владелец.
+    """
+
+    def __init__(self, redis_adapter: Any, key: str, ttl: int) -> NoReturn:
+        self.redis_adapter = redis_adapter
+        self.key = key
+        self.ttl = ttl
+        self.token: Optional[str] = None
+        self.lost = threading.Event()
+        self.renew_script = redis_adapter.register_script(RENEW_SCRIPT)
+        self.release_script = redis_adapter.register_script(RELEASE_SCRIPT)
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None and not self.lost.is_set()
+
+    def acquire(self) -> bool:
+        """Try to take the lease."""
+        token = str(self.redis_adapter.incr(f"{self.key}:fence"))
+        if not self.redis_adapter.set(self.key, token, nx=True, px=self.ttl):
+            return False
+        self.token = token
+        self.lost.clear()
+        threading.Thread(target=self.heartbeat, args=(token,), daemon=True).start()
+        logger.info(f"Lease ({self.key}) taken with token {token}")
+        return True
+
+    def wait(self, interval: float) -> NoReturn:
+        """Take the lease, wait as a standby while another ETL holds it."""
+        while not self.acquire():
+            logger.info(f"Lease ({self.key}) is held by another ETL, waiting")
+            time.sleep(interval)
+
+    def heartbeat(self, token: str) -> NoReturn:
+        """Renew the lease until it is lost or released."""
+        while not self.lost.wait(self.ttl / 3000):
+            if self.token != token:
+                return
+            try:
+                renewed = self.renew_script(keys=[self.key], args=[token, self.ttl])
+            except Exception as err:
+                logger.error(f"Lease ({self.key}) renewal failed: {err}")
+                continue
+            if not renewed:
+                logger.error(f"Lease ({self.key}) with token {token} is lost")
+                self.lost.set()
+
+    def release(self) -> NoReturn:
+        """Give the lease away."""
+        if self.token is not None:
+            self.release_script(keys=[self.key], args=[self.token])
+            self.token = None
+            self.lost.set()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Listener of changes notified by triggers in the source database."""
+
+import json
+import select
+import time
+from contextlib import closing
+from typing import Any, Iterator
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from backoff import backoff_decorator
+from config import logger
+from extractors import connect
+
+
+@backoff_decorator(dependency="postgres", max_timeout=10, max_tries=30)
+def iter_changes(config: Any) -> Iterator:
+    """Get debounced batches of changes notified to the channel.
+
+    A batch is closed after `config.listen_debounce` ms without new
+    notifications, but not later than `config.listen_max_delay` ms after
+    its first one. An empty batch comes right after LISTEN, so changes
+    made before it are loaded too, and after `config.listen_idle` seconds
+    of silence. The connection stays in LISTEN, so it is not taken
+    from the pool. A lost connection is opened again with a new LISTEN
+    and an empty batch, like at the start.
+    """
+    with closing(connect(config)) as conn:
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+        cursor.execute(f"LISTEN {config.listen_channel};")
+        logger.info(f"Listening to {config.listen_channel}")
+        yield []
+
+        changes = []
+        deadline = None
+        while True:
+            if changes:
+                timeout = min(
+                    config.listen_debounce / 1000, deadline - time.monotonic()
+                )
+            else:
+                timeout = config.listen_idle
+            if timeout > 0 and select.select([conn], [], [], timeout)[0]:
+                conn.poll()
+                while conn.notifies:
+                    changes.append(json.loads(conn.notifies.pop(0).payload))
+                if deadline is None and changes:
+                    deadline = time.monotonic() + config.listen_max_delay / 1000
+                if deadline is None or time.monotonic() < deadline:
+                    continue
+            yield changes
+            changes = []
+            deadline = None
+
+
+def count_changes(changes: list) -> dict:
+    """Count changes by table for logging."""
+    counts = {}
+    for change in changes:
+        counts[change["table"]] = counts.get(change["table"], 0) + 1
+    return counts
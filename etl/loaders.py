@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Loaders to the target database."""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterator, NoReturn, Optional
+
+import elasticsearch
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from backoff import backoff_decorator
+from config import logger
+from metrics import BULK_FAILED, count_rows, observe_bulk
+
+RETRY_STATUSES = (429, 503)
+
+
+def loader_data_to_es(es: Any, data: Any, index_name: Optional[str] = None) -> dict:
+    """Data loader to the target database."""
+    response = es.bulk(index=index_name, body=data)
+    return response
+
+
+def encode_line(item: dict) -> bytes:
+    """Encode one line of a bulk request, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def encode_actions(data: list, index_name: str) -> list:
+    """Encode bulk data to one bytes entry per action."""
+    return list(iter_encoded_actions(data, index_name))
+
+
+def iter_encoded_actions(data: list, index_name: str) -> Iterator:
+    """Encode bulk data to one bytes entry per action.
+
+    Every action but delete is followed by its source line.
+    """
+    items = iter(data)
+    for action in items:
+        (op_type, meta), *_ = action.items()
+        entry = encode_line({op_type: {"_index": index_name, **meta}})
+        if op_type != "delete":
+            entry += encode_line(next(items))
+        yield entry
+
+
+def split_bulk_items(entries: list, response: dict, retry: bool) -> tuple:
+    """Split failed actions of a bulk response to retryable and failed ones.
+
+    Items of the response follow the actions of the request, one entry
+    per action. Rejected items (429, 503) are retried while `retry` is
+    set, other errors are permanent.
+    """
+    retryable = []
+    failed = []
+    if not response["errors"]:
+        return retryable, failed
+    for entry, item in zip(entries, response["items"]):
+        result = item[next(iter(item))]
+        if "error" not in result:
+            continue
+        BULK_FAILED.labels(result.get("status")).inc()
+        if retry and result.get("status") in RETRY_STATUSES:
+            retryable.append(entry)
+        else:
+            failed.append((entry, result))
+    return retryable, failed
+
+
+def retry_delay(config: Any, attempt: int) -> float:
+    """Get a full jitter delay before the retry of rejected items."""
+    return random.uniform(
+        0, min(config.es_retry_max_delay, config.es_retry_delay * 2**attempt)
+    )
+
+
+def log_failed_items(failed: list) -> NoReturn:
+    """Log failed actions once per bulk request."""
+    status, error = failed[0][1].get("status"), failed[0][1].get("error")
+    logger.error(f"{len(failed)} bulk actions failed, first with {status}: {error}")
+
+
+class AdaptiveBulkSize:
+    """
+    Размер bulk запроса в байтах, который подстраивается под ES:
+    растёт, пока запросы быстрые, и уменьшается при медленных ответах
+    и отказах (429).
+    """
+
+    def __init__(self, config: Any) -> NoReturn:
+        self.target = config.es_bulk_bytes
+        self.minimum = config.es_bulk_min_bytes
+        self.maximum = config.es_bulk_max_bytes
+        self.took = config.es_bulk_took
+        self.lock = threading.Lock()
+
+    def resize(self, factor: float) -> NoReturn:
+        with self.lock:
+            target = int(self.target * factor)
+            self.target = max(self.minimum, min(self.maximum, target))
+
+    def observe(self, response: dict) -> NoReturn:
+        """Adapt target size to the bulk response."""
+        rejected = response["errors"] and any(
+            item[next(iter(item))].get("status") == 429 for item in response["items"]
+        )
+        if rejected:
+            self.rejected()
+        elif response["took"] > self.took * 1.5:
+            self.resize(0.75)
+        elif response["took"] < self.took:
+            self.resize(1.25)
+
+    def rejected(self) -> NoReturn:
+        """Halve target size after ES rejected the request."""
+        logger.info(f"Bulk rejected by ES, target size is {self.target // 2} bytes")
+        self.resize(0.5)
+
+
+class BulkPool:
+    """
+    Общий пул bulk запросов к ES для всех загрузчиков. Ограничивает число
+    одновременных запросов и очередь сразу для всех сущностей, поэтому
+    параллельные пайплайны не перегружают ES.
+    """
+
+    def __init__(
+        self, es: Any, config: Any, dead_letters: Optional[Any] = None
+    ) -> NoReturn:
+        self.es = es
+        self.config = config
+        self.dead_letters = dead_letters
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.es_workers, thread_name_prefix="bulk"
+        )
+        self.slots = threading.BoundedSemaphore(
+            config.es_workers + config.es_queue_size
+        )
+        self.size = AdaptiveBulkSize(config)
+        self.max_actions = config.es_bulk_actions
+
+    @backoff_decorator(dependency="elasticsearch")
+    def request(self, entries: list) -> dict:
+        """Send bulk request and adapt bulk size to the response."""
+        body = b"".join(entries)
+        started = time.monotonic()
+        try:
+            response = loader_data_to_es(self.es, body)
+        except elasticsearch.TransportError as err:
+            if err.status_code == 429:
+                self.size.rejected()
+                BULK_FAILED.labels(429).inc(len(entries))
+            raise
+        observe_bulk(started, body, len(entries))
+        self.size.observe(response)
+        return response
+
+    def send(self, entries: list) -> NoReturn:
+        """Send entries, retry rejected items and keep failed ones aside.
+
+        Only the rejected items are sent again, after a jittered delay.
+        """
+        for attempt in range(self.config.es_retries + 1):
+            response = self.request(entries)
+            entries, failed = split_bulk_items(
+                entries, response, attempt < self.config.es_retries
+            )
+            self.fail(failed)
+            if not entries:
+                return
+            logger.info(f"Retrying {len(entries)} rejected bulk actions")
+            time.sleep(retry_delay(self.config, attempt))
+
+    def fail(self, failed: list) -> NoReturn:
+        """Send permanently failed actions to the dead letters."""
+        if not failed:
+            return
+        log_failed_items(failed)
+        if self.dead_letters is not None:
+            self.dead_letters.add(failed)
+
+    def submit(self, entries: list) -> Future:
+        """Submit bulk request, wait while the queue is full."""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.send, entries)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def __enter__(self) -> "BulkPool":
+        return self
+
+    def __exit__(self, *args) -> NoReturn:
+        self.executor.shutdown(wait=True)
+
+
+class BulkLoader:
+    """
+    Загрузчик одного пайплайна, который держит несколько bulk запросов
+    к ES одновременно через общий пул.
+    Очередь ограничена, поэтому экстрактор ждёт, пока ES не освободится.
+    Действия копятся в буфере, пока не наберётся нужный размер в байтах
+    или максимальное число действий.
+    """
+
+    def __init__(self, pool: BulkPool) -> NoReturn:
+        self.pool = pool
+        self.pending = deque()
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_callbacks = []
+
+    def load(self, entries: list, entity: Optional[str] = None) -> NoReturn:
+        """Add encoded actions to the buffer, send it when the buffer is full.
+
+        Actions are counted as loaded for `entity` once they are in ES.
+        """
+        for entry in entries:
+            self.buffer.append(entry)
+            self.buffer_bytes += len(entry)
+            if (
+                self.buffer_bytes >= self.pool.size.target
+                or len(self.buffer) >= self.pool.max_actions
+            ):
+                self.flush()
+        if entity is not None and entries:
+            self.then(partial(count_rows, entity, "loaded", len(entries)))
+
+    def flush(self) -> NoReturn:
+        """Submit buffered actions, wait while the queue is full."""
+        if not self.buffer:
+            return
+        future = self.pool.submit(self.buffer)
+        self.pending.append((future, self.buffer_callbacks))
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_callbacks = []
+        self.collect()
+
+    def then(self, callback: Callable) -> NoReturn:
+        """Call callback when all actions loaded so far are in ES."""
+        if self.buffer:
+            self.buffer_callbacks.append(callback)
+        elif self.pending:
+            self.pending[-1][1].append(callback)
+        else:
+            callback()
+
+    def collect(self, wait: bool = False) -> NoReturn:
+        """Run callbacks of finished bulk requests in submission order."""
+        while self.pending and (wait or self.pending[0][0].done()):
+            future, callbacks = self.pending.popleft()
+            future.result()
+            for callback in callbacks:
+                callback()
+
+    def join(self) -> NoReturn:
+        """Send the buffer and wait for all bulk requests."""
+        self.flush()
+        self.collect(wait=True)
@@ -8,34 +8,57 @@ import datetime
 import os
 import sys
 import time
-from typing import Any, Iterator, NoReturn, Optional
-
-import elasticsearch
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Callable, Iterator, NoReturn, Optional
 
 from backoff import backoff_decorator
-from config import Settings, check_pid, logger
-from extractors import iter_bulk_extractor
-from initiation import create_index
-from queries import query_films, query_genres, query_persons
+from cdc import create_slot, group_changes, group_tombstones
+from cdc import iter_changes as iter_cdc_changes
+from config import Settings, handle_errors, logger
+from extractors import (conn_context, get_checkpoint, iter_bulk_extractor,
+                        iter_related_extractor, iter_whole_groups,
+                        save_checkpoint)
+from initiation import bulk_load_settings
+from listener import count_changes, iter_changes
+from loaders import BulkLoader, BulkPool
+from metrics import start_exporter
+from queries import (query_delete_tombstones, query_films,
+                     query_films_by_ids, query_films_genres_by_genre_ids,
+                     query_films_persons_by_person_ids, query_genres,
+                     query_genres_by_ids, query_person_films,
+                     query_person_films_by_person_ids, query_persons,
+                     query_persons_by_ids, query_prune_tombstones,
+                     query_tombstones)
+from runtime import (PROPAGATIONS, configuration, get_dead_letters, get_es,
+                     get_indices, get_schema_files, get_storage,
+                     switch_aliases)
+from shards import FilmShards, shard_state_key
 from state import State
 from storage import RedisStorage
-from transformers import (transformer_films, transformer_genres,
-                          transformer_people_roles, transformer_persons)
-
+from transformers import (PeopleRoles, encode_filmography, transform_deletes,
+                          transform_filmography, transform_films,
+                          transform_rows)
 
-class SingletonError(Exception):
-    pass
+PIPELINES = ("genres", "persons", "films", "filmography")
 
 
-@backoff_decorator
-def extractor_films(config, state) -> Iterator:
+@backoff_decorator(dependency="postgres")
+def extractor_films(config, state, shard: int = 0, shards: int = 1) -> Iterator:
     """Extractor from source database."""
     yield from iter_bulk_extractor(
-        "films", config, query_films, config.batch_size, state
+        "films",
+        config,
+        query_films,
+        config.batch_size,
+        state,
+        query_films_by_ids,
+        {"shard": shard, "shards": shards},
     )
 
 
-@backoff_decorator
+@backoff_decorator(dependency="postgres")
 def extractor_genres(config, state) -> Iterator:
     """Extractor from source database."""
     yield from iter_bulk_extractor(
@@ -43,7 +66,7 @@ def extractor_genres(config, state) -> Iterator:
     )
 
 
-@backoff_decorator
+@backoff_decorator(dependency="postgres")
 def extractor_persons(config, state) -> Iterator:
     """Extractor from source database."""
     yield from iter_bulk_extractor(
@@ -51,123 +74,546 @@ def extractor_persons(config, state) -> Iterator:
     )
 
 
-@backoff_decorator
-def loader_data_to_es(es: Any, data: list, index_name: str) -> dict:
-    """Data loader to the target database."""
-    response = es.bulk(index=index_name, body=data, refresh=True)
-    return response
+@backoff_decorator(dependency="postgres")
+def extractor_filmography(config, state) -> Iterator:
+    """Extractor of films of all persons ordered by person."""
+    yield from iter_whole_groups(
+        iter_bulk_extractor(
+            "filmography", config, query_person_films, config.batch_size, state
+        )
+    )
 
 
-@backoff_decorator
-def get_instance(state, config) -> Any:
-    """Get elastic search instance and init it of required."""
-    es = elasticsearch.Elasticsearch([config.es_address])
-
-    if state.get("innitiated") != "1":
-        json_file_name = config.es_json_file_films
-        index_name = config.es_scheme_films
-        status = create_index(es, json_file_name, index_name)
-
-        json_file_name = config.es_json_file_persons
-        index_name = config.es_scheme_persons
-        status = create_index(es, json_file_name, index_name)
-
-        json_file_name = config.es_json_file_genres
-        index_name = config.es_scheme_genres
-        status = create_index(es, json_file_name, index_name)
-
-        logger.info("last_bulk_extractors set to the default value")
-        state.set("last_bulk_extractor_films", "1900-01-01 01:00:00")
-        state.set("last_bulk_extractor_persons", "1900-01-01 01:00:00")
-        state.set("last_bulk_extractor_genres", "1900-01-01 01:00:00")
-        if status["acknowledged"]:
-            state.set("innitiated", 1)
-    return es
-
-
-def check_singleton(state: Any) -> NoReturn:
-    """Check that app is singleton."""
-
-    mypid = os.getpid()
-    if state.is_empty() or not state.get("pid"):
-        state.set("pid", mypid)
-    else:
-        pid = int(state.get("pid"))
-        if pid != mypid and check_pid(pid):
-            raise SingletonError(f"Other process is running with pid={pid}")
-        else:
-            logger.info(f"Starting new process instead of pid={pid}")
-            state.set("pid", os.getpid())
+@backoff_decorator(dependency="postgres")
+def extractor_tombstones(config, state) -> Iterator:
+    """Extractor of rows deleted from the source database."""
+    yield from iter_bulk_extractor(
+        "tombstones", config, query_tombstones, config.batch_size, state
+    )
 
 
-# @backoff_decorator
-def get_storage() -> RedisStorage:
-    """Get storage."""
-    config = Settings()
-    storage = RedisStorage(config)
-    return storage, config
+@backoff_decorator(dependency="postgres")
+def prune_tombstones(config, state) -> NoReturn:
+    """Delete tombstones loaded before the overlap window of the checkpoint.
+
+    The ones inside the window are read again by the next run.
+    """
+    checkpoint = get_checkpoint(state, "tombstones", config.watermark_overlap)
+    with conn_context(config) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query_prune_tombstones, checkpoint)
+        pruned = cursor.rowcount
+        conn.commit()
+    logger.info(f"Pruned tombstones: ({pruned})")
+
+
+@backoff_decorator(dependency="postgres")
+def delete_tombstones(config, ids: list) -> NoReturn:
+    """Delete tombstones of deletes loaded from the replication stream."""
+    with conn_context(config) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query_delete_tombstones, {"ids": ids})
+        conn.commit()
+
+
+@backoff_decorator(dependency="postgres")
+def extractor_related_films(config, name: str, query: str, ids: list) -> Iterator:
+    """Extractor of films related to the changed rows."""
+    yield from iter_related_extractor(name, config, query, ids, config.batch_size)
+
+
+def propagate_to_films(
+    config: Any,
+    loader: BulkLoader,
+    name: str,
+    query: str,
+    transformer: str,
+    row_bulk: list,
+    index_name: str,
+) -> int:
+    """Update denormalised fields of films related to the changed rows."""
+    total = 0
+    ids = [row["id"] for row in row_bulk]
+    for films_bulk in extractor_related_films(config, name, query, ids):
+        loader.load(
+            transform_rows(transformer, films_bulk, index_name, config.validate),
+            transformer,
+        )
+        total += len(films_bulk)
+    return total
+
+
+def load_filmography(
+    config: Any, loader: BulkLoader, person_ids: list, index_name: str
+) -> int:
+    """Update filmography of the given persons.
+
+    Persons left without films get an empty filmography.
+    """
+    total = 0
+    without_films = set(person_ids)
+    for rows_batch in iter_whole_groups(
+        extractor_related_films(
+            config, "filmography", query_person_films_by_person_ids, person_ids
+        )
+    ):
+        entries = transform_filmography(rows_batch, index_name)
+        loader.load(entries, "filmography")
+        total += len(entries)
+        without_films.difference_update(str(row["id"]) for row in rows_batch)
+    entries = [
+        encode_filmography(person_id, [], index_name) for person_id in without_films
+    ]
+    loader.load(entries, "filmography")
+    return total + len(entries)
+
+
+def load_films(
+    config: Any,
+    state: State,
+    loader: BulkLoader,
+    indices: dict,
+    propagate: bool,
+    shard: int = 0,
+    shards: int = 1,
+    persons_loaded: Optional[Future] = None,
+) -> tuple:
+    """Load changed films of the shard and filmography of their persons.
+
+    Filmography is written into existing persons docs, so it waits for
+    the persons pipeline when it runs alongside.
+    """
+    total = 0
+    total_people = 0
+    people_roles = PeopleRoles() if propagate else None
+    for row_bulk in extractor_films(config, state, shard, shards):
+        entries = transform_films(
+            row_bulk, indices["films"], people_roles, config.validate
+        )
+        loader.load(entries, "films")
+        total += len(entries)
+        if propagate:
+            if persons_loaded is not None:
+                persons_loaded.result()
+            total_people += load_filmography(
+                config, loader, people_roles.pop_new(), indices["persons"]
+            )
+        loader.then(partial(save_checkpoint, state, "films", row_bulk))
+    loader.join()
+    return total, total_people
+
+
+def load_film_shard(
+    config: Any,
+    pool: BulkPool,
+    film_shards: FilmShards,
+    job: dict,
+    shard: int,
+    lease: Any,
+) -> tuple:
+    """Load one shard of the films job under the shard lease.
+
+    Each shard keeps its checkpoints in its own state, they start over
+    when a new rebuild is published.
+    """
+    storage = RedisStorage(config, key=shard_state_key(shard))
+    storage.fence(lease)
+    state = State(storage)
+    try:
+        if state.get("generation") != job["generation"]:
+            if job["rebuild"] == "1":
+                state.clear()
+            state.set("generation", job["generation"])
+
+        logger.info(f"Loading films shard {shard} of job {job['generation']}")
+        result = load_films(
+            config,
+            state,
+            BulkLoader(pool),
+            job,
+            job["rebuild"] != "1",
+            shard,
+            int(job["shards"]),
+        )
+        film_shards.done(job, shard)
+    finally:
+        lease.release()
+    return result
+
+
+def load_film_shards(
+    config: Any, state: State, pool: BulkPool, indices: dict, rebuild: bool
+) -> tuple:
+    """Publish films job for the workers and take part in it until done."""
+    storage = get_storage()[0]
+    film_shards = FilmShards(storage.redis_adapter, config)
+    job = film_shards.job()
+    if not job or job["generation"] != state.get("films_generation"):
+        job = film_shards.publish(indices, rebuild)
+        state.set("films_generation", job["generation"])
 
+    total = 0
+    total_people = 0
+    while not film_shards.is_done(job):
+        claimed = film_shards.claim(job)
+        if claimed is None:
+            time.sleep(config.lease_retry)
+            continue
+        shard_total, shard_people = load_film_shard(
+            config, pool, film_shards, job, *claimed
+        )
+        total += shard_total
+        total_people += shard_people
+    state.set("films_generation", "")
+    return total, total_people
+
+
+def load_genres(
+    config: Any, state: State, loader: BulkLoader, indices: dict, propagate: bool
+) -> list:
+    """Genres pipeline: genres.
+
+    With `propagate` the batches are returned instead of checkpointed,
+    their films are updated by `propagate_changes` after the films pass.
+    """
+    total = 0
+    changed = []
+    for row_bulk in extractor_genres(config, state):
+        entries = transform_rows("genres", row_bulk, indices["genres"], config.validate)
+        loader.load(entries, "genres")
+        total += len(entries)
+        if propagate:
+            changed.append(row_bulk)
+        else:
+            loader.then(partial(save_checkpoint, state, "genres", row_bulk))
+    loader.join()
 
-def configuration(force: bool) -> tuple:
-    """Configure ETL."""
-    storage, config = get_storage()
-    state = State(storage)
+    logger.info(f"Done with genres. ({total})")
+    return changed
 
-    check_singleton(state)
 
-    if force:
-        state.clear()
-    es = get_instance(state, config)
-    # logger.info(f"Current state: {state}")
+def load_persons(
+    config: Any, state: State, loader: BulkLoader, indices: dict, propagate: bool
+) -> list:
+    """Persons pipeline: persons, like `load_genres`."""
+    total = 0
+    changed = []
+    for row_bulk in extractor_persons(config, state):
+        entries = transform_rows(
+            "persons", row_bulk, indices["persons"], config.validate
+        )
+        loader.load(entries, "persons")
+        total += len(entries)
+        if propagate:
+            changed.append(row_bulk)
+        else:
+            loader.then(partial(save_checkpoint, state, "persons", row_bulk))
+    loader.join()
 
-    return config, state, es
+    logger.info(f"Done with persons: ({total})")
+    return changed
+
+
+def propagate_changes(
+    config: Any,
+    state: State,
+    loader: BulkLoader,
+    indices: dict,
+    name: str,
+    changed: list,
+) -> NoReturn:
+    """Update films of changed genres or persons and save their checkpoints.
+
+    It runs after the films pipeline, so a films doc indexed from an
+    older read never lands over the newer partial update. Until then
+    the checkpoints stay behind, and a failed run loads the batches again.
+    """
+    films_query, transformer = PROPAGATIONS[name]
+    total = 0
+    for row_bulk in changed:
+        total += propagate_to_films(
+            config, loader, name, films_query, transformer, row_bulk, indices["films"]
+        )
+        loader.then(partial(save_checkpoint, state, name, row_bulk))
+    loader.join()
+
+    logger.info(f"Done with films of changed {name}: ({total})")
+
+
+def load_films_pipeline(
+    config: Any,
+    state: State,
+    pool: BulkPool,
+    indices: dict,
+    rebuild: bool,
+    persons_loaded: Future,
+) -> NoReturn:
+    """Films pipeline: films and filmography of their persons."""
+    if config.film_shards > 1:
+        # Workers in other processes can't wait for the persons pipeline,
+        # so the job is published once persons docs are in ES.
+        persons_loaded.result()
+        total, total_people = load_film_shards(config, state, pool, indices, rebuild)
+    else:
+        total, total_people = load_films(
+            config,
+            state,
+            BulkLoader(pool),
+            indices,
+            not rebuild,
+            persons_loaded=persons_loaded,
+        )
+
+    logger.info(f"Done with films: ({total})")
+    logger.info(f"Done with filmography of persons of changed films: ({total_people})")
+
+
+def load_all_filmography(
+    config: Any,
+    state: State,
+    loader: BulkLoader,
+    indices: dict,
+    persons_loaded: Future,
+) -> NoReturn:
+    """Filmography pipeline: films of all persons, after persons are loaded."""
+    persons_loaded.result()
+    total = 0
+    for row_bulk in extractor_filmography(config, state):
+        entries = transform_filmography(row_bulk, indices["persons"])
+        loader.load(entries, "filmography")
+        total += len(entries)
+        loader.then(partial(save_checkpoint, state, "filmography", row_bulk))
+    loader.join()
+
+    logger.info(f"Done with people filmography: ({total})")
 
 
 @backoff_decorator
 def main(force=False) -> NoReturn:
-    """The entrypoint function."""
-    config, state, es = configuration(force)
+    """The entrypoint function.
 
-    total = 0
-    for row_bulk in extractor_genres(config, state):
-        transformed_data = sum(map(transformer_genres, row_bulk), [])
-        # logger.info(f"Uploading {len(transformed_data)/2} items to ES")
-        if transformed_data:
-            loader_data_to_es(es, transformed_data, config.es_scheme_genres)
-            total += len(transformed_data) / 2
+    Genres, persons and films are loaded by concurrent pipelines, each
+    with its own DB connection and loader. All of them share one ES
+    client and one pool of bulk requests, which limits the load on ES.
+    Films of changed genres and persons are updated once films are done.
+    """
+    config, state, es = configuration(force)
 
-    logger.info(f"Done with genres. ({total})")
+    indices = get_indices(state, config)
+    rebuild = state.get("rebuild") == "1"
+    # Films changed through persons and genres are updated in place, and
+    # persons of changed films get their filmography, unless the indices
+    # are being filled from scratch.
+    propagate = not rebuild
+    full_load = (
+        bulk_load_settings(es, get_schema_files(indices, config))
+        if rebuild
+        else nullcontext()
+    )
 
+    with full_load, BulkPool(es, config, get_dead_letters()) as pool:
+        with ThreadPoolExecutor(
+            max_workers=len(PIPELINES), thread_name_prefix="pipeline"
+        ) as pipelines:
+            genres = pipelines.submit(
+                load_genres, config, state, BulkLoader(pool), indices, propagate
+            )
+            persons = pipelines.submit(
+                load_persons, config, state, BulkLoader(pool), indices, propagate
+            )
+            films = pipelines.submit(
+                load_films_pipeline, config, state, pool, indices, rebuild, persons
+            )
+            futures = [genres, persons, films]
+            if rebuild:
+                futures.append(
+                    pipelines.submit(
+                        load_all_filmography,
+                        config,
+                        state,
+                        BulkLoader(pool),
+                        indices,
+                        persons,
+                    )
+                )
+            for future in futures:
+                future.result()
+            propagated = [
+                pipelines.submit(
+                    propagate_changes,
+                    config,
+                    state,
+                    BulkLoader(pool),
+                    indices,
+                    name,
+                    future.result(),
+                )
+                for name, future in (("genres", genres), ("persons", persons))
+            ]
+            for future in propagated:
+                future.result()
+        # Deletes go last, so nothing loaded by the pipelines above
+        # brings a deleted document back.
+        load_deletes(config, state, BulkLoader(pool), indices)
+
+    if rebuild:
+        switch_aliases(state, config, es)
+    state.set("in_progress", 0)
+
+
+def load_changes(
+    config: Any, loader: BulkLoader, indices: dict, grouped: dict
+) -> NoReturn:
+    """Load changes grouped by `cdc.group_changes`.
+
+    Genres and persons go first, so films and filmography are written
+    over the docs they depend on.
+    """
+    for name in ("films", "persons", "genres"):
+        loader.load(
+            transform_deletes(grouped[name]["deleted"], indices[name]), "deletes"
+        )
+    for name, query, films_query, transformer in (
+        ("genres", query_genres_by_ids, query_films_genres_by_genre_ids, "film_genres"),
+        (
+            "persons",
+            query_persons_by_ids,
+            query_films_persons_by_person_ids,
+            "film_persons",
+        ),
+    ):
+        ids = list(grouped[name]["changed"])
+        if not ids:
+            continue
+        for row_bulk in extractor_related_films(config, name, query, ids):
+            loader.load(
+                transform_rows(name, row_bulk, indices[name], config.validate), name
+            )
+        propagate_to_films(
+            config,
+            loader,
+            name,
+            films_query,
+            transformer,
+            [{"id": _id} for _id in ids],
+            indices["films"],
+        )
+    loader.join()
+
+    ids = list(grouped["films"]["changed"])
+    if ids:
+        for row_bulk in extractor_related_films(
+            config, "films", query_films_by_ids, ids
+        ):
+            loader.load(
+                transform_films(row_bulk, indices["films"], None, config.validate),
+                "films",
+            )
+    if grouped["filmography"]:
+        load_filmography(
+            config, loader, list(grouped["filmography"]), indices["persons"]
+        )
+    loader.join()
+
+
+def load_deletes(
+    config: Any, state: State, loader: BulkLoader, indices: dict
+) -> NoReturn:
+    """Deletes pipeline: delete documents of rows left as tombstones.
+
+    Films which lost persons or genres are reloaded, and persons which
+    lost films get their filmography updated.
+    """
     total = 0
-    for row_bulk in extractor_persons(config, state):
-        transformed_data = sum(map(transformer_persons, row_bulk), [])
-        # logger.info(f"Uploading {len(transformed_data)/2} items to ES")
-        if transformed_data:
-            loader_data_to_es(es, transformed_data, config.es_scheme_persons)
-            total += len(transformed_data) / 2
+    for row_bulk in extractor_tombstones(config, state):
+        load_changes(config, loader, indices, group_tombstones(row_bulk))
+        total += len(row_bulk)
+        loader.then(partial(save_checkpoint, state, "tombstones", row_bulk))
+    loader.join()
+    prune_tombstones(config, state)
 
-    logger.info(f"Done with persons: ({total})")
+    logger.info(f"Done with deletes: ({total})")
 
-    total = 0
-    total_people = 0
-    for row_bulk in extractor_films(config, state):
-        transformed_data = sum(map(transformer_films, row_bulk), [])
-        # logger.info(f"Uploading {len(transformed_data)/2} items to ES")
-        if transformed_data:
-            loader_data_to_es(es, transformed_data, config.es_scheme_films)
-            total += len(transformed_data) / 2
-
-        transformed_data = sum(map(transformer_people_roles, row_bulk), [])
-        # logger.info(f"Uploading {len(transformed_data)/2} items to ES")
-        if transformed_data:
-            loader_data_to_es(es, transformed_data, config.es_scheme_persons)
-            total_people += len(transformed_data) / 2
 
-    logger.info(f"Done with films: ({total})")
-    logger.info(f"Done with people roles: ({total_people})")
+def stream(run: Callable) -> NoReturn:
+    """Load changes from the logical replication slot.
+
+    The slot is created before the first load, which catches up from
+    the checkpoints. Then changes are loaded in micro-batches and the
+    LSN of each loaded batch is kept in the state. Deletes come from the
+    stream, so the tombstones left by them are dropped once loaded.
+    """
+    config = Settings()
+    create_slot(config)
+    run()
+    config, state, es = configuration(force=False)
+    indices = get_indices(state, config)
+    start_lsn = int(state.get("cdc_lsn") or 0)
+    with BulkPool(es, config, get_dead_letters()) as pool:
+        loader = BulkLoader(pool)
+        for changes, lsn in iter_cdc_changes(config, start_lsn):
+            grouped = group_changes(changes)
+            logger.info(f"Loading {len(changes)} changes up to LSN {lsn}")
+            load_changes(config, loader, indices, grouped)
+            if grouped["tombstones"]:
+                delete_tombstones(config, list(grouped["tombstones"]))
+            state.set("cdc_lsn", lsn)
+
+
+def get_runner(config: Settings) -> Callable:
+    """Get the entrypoint function of the configured engine."""
+    if config.engine == "asyncio":
+        import asyncio
+
+        import async_main
+
+        # One event loop for all runs keeps the async pools alive.
+        loop = asyncio.new_event_loop()
+        return lambda force=False: loop.run_until_complete(async_main.main(force))
+    return main
+
+
+def listen(run: Callable) -> NoReturn:
+    """Load changes shortly after the triggers notify about them.
+
+    Notifications only wake the ETL up, the changes are found from the
+    saved checkpoints, so nothing is lost while the listener is down.
+    """
+    for changes in iter_changes(Settings()):
+        if changes:
+            logger.info(f"Changes notified: {count_changes(changes)}")
+        run()
+
+
+def worker() -> NoReturn:
+    """Load films shards published by the main ETL process."""
+    storage, config, _ = get_storage()
+    film_shards = FilmShards(storage.redis_adapter, config)
+    pool = BulkPool(get_es(), config, get_dead_letters())
+    while True:
+        job = film_shards.job()
+        claimed = film_shards.claim(job) if job else None
+        if claimed is None:
+            time.sleep(config.lease_retry)
+            continue
+        try:
+            load_film_shard(config, pool, film_shards, job, *claimed)
+        except Exception as err:
+            handle_errors(err)
 
 
 if __name__ == "__main__":
+    config = Settings()
+    start_exporter(config.metrics_port)
+    if config.role == "worker":
+        worker()
+    run = get_runner(config)
+    if config.mode == "listen":
+        listen(run)
+    if config.mode == "cdc":
+        stream(run)
+    # Incremental runs are safe with the watermark overlap, full rebuilds
+    # on every run are kept for ETL_MODE=rebuild.
     while True:
-        main(force=True)
+        run(force=config.mode == "rebuild")
         time.sleep(1000)
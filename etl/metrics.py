@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Prometheus metrics of the ETL."""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterator, NoReturn, Optional
+
+from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client.core import (REGISTRY, CounterMetricFamily,
+                                    GaugeMetricFamily)
+
+from backoff import retry_stats
+from config import DEFAULT_MODIFIED, logger
+
+ROWS = Counter(
+    "etl_rows",
+    "Rows extracted, transformed to actions and loaded, by entity",
+    ["entity", "stage"],
+)
+BATCH_ROWS = Histogram(
+    "etl_batch_rows",
+    "Rows in extracted batches",
+    ["entity"],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000),
+)
+BULK_SECONDS = Histogram(
+    "etl_bulk_seconds",
+    "Latency of bulk requests to ES",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+BULK_BYTES = Counter("etl_bulk_bytes", "Bytes sent in bulk requests")
+BULK_ACTIONS = Histogram(
+    "etl_bulk_actions",
+    "Actions in bulk requests",
+    buckets=(10, 100, 500, 1000, 2500, 5000, 10000),
+)
+BULK_FAILED = Counter(
+    "etl_bulk_failed_actions",
+    "Bulk actions rejected or failed by ES, by status",
+    ["status"],
+)
+
+# Entities with a `modified` watermark in the state.
+LAG_ENTITIES = ("films", "persons", "genres", "tombstones")
+
+
+class StateCollector:
+    """
+    Метрики, которые считаются при запросе: задержка индексации по
+    сущностям (сейчас минус `last_bulk_extractor_*` из состояния)
+    и повторы backoff по зависимостям. Когда фильмы грузятся шардами,
+    их задержка берётся по самому отстающему шарду.
+    """
+
+    def __init__(self) -> NoReturn:
+        self.state: Optional[Any] = None
+        self.redis_adapter: Optional[Any] = None
+        self.shard_keys = ()
+
+    def watermarks(self, name: str) -> list:
+        """Get watermarks of the entity, one per films shard if sharded."""
+        key = f"last_bulk_extractor_{name}"
+        if name != "films" or not self.shard_keys:
+            return [self.state.get(key)]
+        try:
+            return [
+                self.redis_adapter.hget(shard_key, key) for shard_key in self.shard_keys
+            ]
+        except Exception as err:
+            logger.error(f"Can't read watermarks of films shards: {err}")
+            return []
+
+    def collect(self) -> Iterator:
+        lag = GaugeMetricFamily(
+            "etl_lag_seconds",
+            "Now minus the watermark of the last loaded row, by entity",
+            labels=["entity"],
+        )
+        if self.state is not None:
+            now = datetime.now(timezone.utc)
+            for name in LAG_ENTITIES:
+                # Entities which have not loaded any rows yet have no lag.
+                watermarks = [
+                    datetime.fromisoformat(watermark)
+                    for watermark in self.watermarks(name)
+                    if watermark and watermark != DEFAULT_MODIFIED
+                ]
+                if watermarks:
+                    modified = min(
+                        watermark
+                        if watermark.tzinfo
+                        else watermark.replace(tzinfo=timezone.utc)
+                        for watermark in watermarks
+                    )
+                    lag.add_metric([name], (now - modified).total_seconds())
+        yield lag
+
+        backoff = CounterMetricFamily(
+            "etl_backoff_events",
+            "Failures, retries, give-ups and circuit openings by dependency",
+            labels=["dependency", "event"],
+        )
+        for (dependency, event), count in list(retry_stats.items()):
+            backoff.add_metric([dependency, event], count)
+        yield backoff
+
+
+collector = StateCollector()
+REGISTRY.register(collector)
+
+
+def track_state(
+    state: Any, redis_adapter: Optional[Any] = None, shard_keys: tuple = ()
+) -> NoReturn:
+    """Report the lag of the given state.
+
+    With `shard_keys` the films lag comes from the states of the films
+    shards at these keys in Redis instead.
+    """
+    collector.state = state
+    collector.redis_adapter = redis_adapter
+    collector.shard_keys = tuple(shard_keys)
+
+
+def start_exporter(port: int) -> NoReturn:
+    """Serve metrics over HTTP, port 0 disables the exporter."""
+    if port:
+        start_http_server(port)
+        logger.info(f"Metrics are served on port {port}")
+
+
+def count_rows(entity: str, stage: str, count: int) -> NoReturn:
+    ROWS.labels(entity, stage).inc(count)
+
+
+def observe_batch(entity: str, rows_batch: list) -> NoReturn:
+    """Count an extracted batch."""
+    ROWS.labels(entity, "extracted").inc(len(rows_batch))
+    BATCH_ROWS.labels(entity).observe(len(rows_batch))
+
+
+def observe_bulk(started: float, body: bytes, actions: int) -> NoReturn:
+    """Count a bulk request started at `started` (time.monotonic)."""
+    BULK_SECONDS.observe(time.monotonic() - started)
+    BULK_BYTES.inc(len(body))
+    BULK_ACTIONS.observe(actions)
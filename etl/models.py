@@ -107,3 +107,41 @@ class MovieModel(BaseModel):
         if value is None:
             return []
         return value
+
+
+class FilmPersonsModel(BaseModel):
+    """Persons fields of a film, for partial updates of films."""
+
+    id: UUID
+    directors: Optional[List] = []
+    directors_names: Optional[List] = []
+    actors: Optional[List] = []
+    actors_names: Optional[List] = []
+    writers_names: Optional[List] = []
+    writers: Optional[List] = []
+
+    @validator(
+        "directors",
+        "directors_names",
+        "actors",
+        "actors_names",
+        "writers_names",
+        "writers",
+    )
+    def valid_lists(cls, value):
+        if value is None:
+            return []
+        return value
+
+
+class FilmGenresModel(BaseModel):
+    """Genres field of a film, for partial updates of films."""
+
+    id: UUID
+    genres: Optional[List] = []
+
+    @validator("genres")
+    def valid_genres(cls, value):
+        if value is None:
+            return []
+        return value
@@ -5,40 +5,154 @@
 # @contact: ad3002@gmail.com
 
 query_films = """
+        SELECT changed.id, MAX(changed.modified) AS modified
+        FROM (
+            SELECT content.film_work.id, content.film_work.modified
+            FROM content.film_work
+            WHERE content.film_work.modified >= %(modified)s::timestamptz
+            UNION ALL
+            SELECT content.person_film_work.film_work_id AS id, content.person_film_work.created
+            FROM content.person_film_work
+            WHERE content.person_film_work.created >= %(modified)s::timestamptz
+            UNION ALL
+            SELECT content.genre_film_work.film_work_id AS id, content.genre_film_work.created
+            FROM content.genre_film_work
+            WHERE content.genre_film_work.created >= %(modified)s::timestamptz
+        ) AS changed
+        WHERE mod(abs(hashtext(changed.id::text)::bigint), %(shards)s) = %(shard)s
+        GROUP BY changed.id
+        HAVING (MAX(changed.modified), changed.id) > (%(modified)s::timestamptz, %(id)s::uuid)
+        ORDER BY modified, changed.id
+        """
+
+query_films_by_ids = """
         SELECT content.film_work.id,
-        content.film_work.rating AS imdb_rating,
-        ARRAY_AGG(DISTINCT content.genre.name) AS genres,
+        COALESCE(content.film_work.rating, 0.0) AS imdb_rating,
+        COALESCE(ARRAY_AGG(DISTINCT content.genre.name)
+        FILTER(WHERE content.genre.name IS NOT NULL), '{}') AS genres,
         content.film_work.title,
-        content.film_work.description,
-        ARRAY_AGG(DISTINCT content.person.full_name)
-        FILTER(WHERE content.person_film_work.role = 'director') AS directors_names,
-        ARRAY_AGG(DISTINCT content.person.full_name)
-        FILTER(WHERE content.person_film_work.role = 'actor') AS actors_names,
-        ARRAY_AGG(DISTINCT content.person.full_name)
-        FILTER(WHERE content.person_film_work.role = 'writer') AS writers_names,
-        JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
-        FILTER(WHERE content.person_film_work.role = 'actor') AS actors,
-        JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
-        FILTER(WHERE content.person_film_work.role = 'writer') AS writers,
-        JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
-        FILTER(WHERE content.person_film_work.role = 'director') AS directors
+        COALESCE(content.film_work.description, '') AS description,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'director'), '{}') AS directors_names,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'actor'), '{}') AS actors_names,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'writer'), '{}') AS writers_names,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'actor'), '[]') AS actors,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'writer'), '[]') AS writers,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'director'), '[]') AS directors
         FROM content.film_work
         LEFT OUTER JOIN content.genre_film_work ON (content.film_work.id = content.genre_film_work.film_work_id)
         LEFT OUTER JOIN content.genre ON (content.genre_film_work.genre_id = content.genre.id)
         LEFT OUTER JOIN content.person_film_work ON (content.film_work.id = content.person_film_work.film_work_id)
         LEFT OUTER JOIN content.person ON (content.person_film_work.person_id = content.person.id)
-        WHERE greatest(content.film_work.modified, content.person.modified, content.genre.modified) > '%s'
+        WHERE content.film_work.id = ANY(%(ids)s::uuid[])
         GROUP BY content.film_work.id, content.film_work.title, content.film_work.description, content.film_work.rating
         """
 
 query_genres = """
-        SELECT content.genre.id, content.genre.name, content.genre.description
+        SELECT content.genre.id, content.genre.modified, content.genre.name,
+        COALESCE(content.genre.description, '') AS description
         FROM content.genre
-        WHERE content.genre.modified > '%s'
+        WHERE (content.genre.modified, content.genre.id) > (%(modified)s::timestamptz, %(id)s::uuid)
+        ORDER BY content.genre.modified, content.genre.id
         """
 
 query_persons = """
+        SELECT content.person.id, content.person.modified, content.person.full_name
+        FROM content.person
+        WHERE (content.person.modified, content.person.id) > (%(modified)s::timestamptz, %(id)s::uuid)
+        ORDER BY content.person.modified, content.person.id
+        """
+
+query_genres_by_ids = """
+        SELECT content.genre.id, content.genre.name,
+        COALESCE(content.genre.description, '') AS description
+        FROM content.genre
+        WHERE content.genre.id = ANY(%(ids)s::uuid[])
+        """
+
+query_persons_by_ids = """
         SELECT content.person.id, content.person.full_name
         FROM content.person
-        WHERE content.person.modified > '%s'
+        WHERE content.person.id = ANY(%(ids)s::uuid[])
+        """
+
+query_films_persons_by_person_ids = """
+        SELECT content.film_work.id,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'director'), '{}') AS directors_names,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'actor'), '{}') AS actors_names,
+        COALESCE(ARRAY_AGG(DISTINCT content.person.full_name)
+        FILTER(WHERE content.person_film_work.role = 'writer'), '{}') AS writers_names,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'actor'), '[]') AS actors,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'writer'), '[]') AS writers,
+        COALESCE(JSON_AGG(DISTINCT jsonb_build_object('id', content.person.id, 'name', content.person.full_name))
+        FILTER(WHERE content.person_film_work.role = 'director'), '[]') AS directors
+        FROM content.film_work
+        JOIN content.person_film_work ON (content.film_work.id = content.person_film_work.film_work_id)
+        JOIN content.person ON (content.person_film_work.person_id = content.person.id)
+        WHERE content.film_work.id IN (
+            SELECT content.person_film_work.film_work_id
+            FROM content.person_film_work
+            WHERE content.person_film_work.person_id = ANY(%(ids)s::uuid[])
+        )
+        GROUP BY content.film_work.id
+        """
+
+query_films_genres_by_genre_ids = """
+        SELECT content.film_work.id,
+        COALESCE(ARRAY_AGG(DISTINCT content.genre.name), '{}') AS genres
+        FROM content.film_work
+        JOIN content.genre_film_work ON (content.film_work.id = content.genre_film_work.film_work_id)
+        JOIN content.genre ON (content.genre_film_work.genre_id = content.genre.id)
+        WHERE content.film_work.id IN (
+            SELECT content.genre_film_work.film_work_id
+            FROM content.genre_film_work
+            WHERE content.genre_film_work.genre_id = ANY(%(ids)s::uuid[])
+        )
+        GROUP BY content.film_work.id
+        """
+
+query_person_films = """
+        SELECT content.person_film_work.person_id AS id,
+        content.person_film_work.film_work_id,
+        content.person_film_work.role
+        FROM content.person_film_work
+        WHERE content.person_film_work.person_id > %(id)s::uuid
+        ORDER BY content.person_film_work.person_id
+        """
+
+query_person_films_by_person_ids = """
+        SELECT content.person_film_work.person_id AS id,
+        content.person_film_work.film_work_id,
+        content.person_film_work.role
+        FROM content.person_film_work
+        WHERE content.person_film_work.person_id = ANY(%(ids)s::uuid[])
+        ORDER BY content.person_film_work.person_id
+        """
+
+query_tombstones = """
+        SELECT content.tombstone.id, content.tombstone.deleted AS modified,
+        content.tombstone.table_name, content.tombstone.object_id,
+        content.tombstone.film_work_id, content.tombstone.person_id
+        FROM content.tombstone
+        WHERE (content.tombstone.deleted, content.tombstone.id) > (%(modified)s::timestamptz, %(id)s::uuid)
+        ORDER BY content.tombstone.deleted, content.tombstone.id
+        """
+
+query_prune_tombstones = """
+        DELETE FROM content.tombstone
+        WHERE content.tombstone.deleted < %(modified)s::timestamptz
+        """
+
+query_delete_tombstones = """
+        DELETE FROM content.tombstone
+        WHERE content.tombstone.id = ANY(%(ids)s::uuid[])
         """
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Shared resources and state of ETL runs, used by both engines.
+
+They live apart from main.py, which runs as __main__: importing it from
+the async engine would create a second copy with its own clients and
+lease.
+"""
+
+from functools import lru_cache
+from typing import Any, NoReturn
+
+import elasticsearch
+
+from backoff import backoff_decorator
+from config import Settings, logger
+from extractors import DEFAULT_ID, DEFAULT_MODIFIED
+from initiation import create_versioned_index, switch_alias
+from lease import RedisLease
+from metrics import track_state
+from queries import (query_films_genres_by_genre_ids,
+                     query_films_persons_by_person_ids)
+from shards import shard_state_key
+from state import State
+from storage import RedisDeadLetters, RedisStorage
+
+# Films query and transformer of partial updates by the changed entity.
+PROPAGATIONS = {
+    "genres": (query_films_genres_by_genre_ids, "film_genres"),
+    "persons": (query_films_persons_by_person_ids, "film_persons"),
+}
+
+
+@backoff_decorator(dependency="elasticsearch")
+def get_instance(state, config) -> Any:
+    """Get elastic search instance and init it of required."""
+    es = get_es()
+
+    if state.get("innitiated") != "1":
+        for name, json_file_name, alias in get_schemes(config):
+            index_name = create_versioned_index(es, json_file_name, alias)
+            state.set(f"index_{name}", index_name)
+
+        logger.info("last_bulk_extractors set to the default value")
+        for name in ("films", "persons", "genres", "filmography", "tombstones"):
+            state.update(
+                {
+                    f"last_bulk_extractor_{name}": DEFAULT_MODIFIED,
+                    f"last_bulk_extractor_{name}_id": DEFAULT_ID,
+                }
+            )
+        state.update({"rebuild": 1, "innitiated": 1})
+    return es
+
+
+def get_schemes(config: Settings) -> list:
+    """Get (name, json file, alias) of every ES index."""
+    return [
+        ("films", config.es_json_file_films, config.es_scheme_films),
+        ("persons", config.es_json_file_persons, config.es_scheme_persons),
+        ("genres", config.es_json_file_genres, config.es_scheme_genres),
+    ]
+
+
+def get_schema_files(indices: dict, config: Settings) -> list:
+    """Get (index name, json file) of the indices to write to."""
+    return [
+        (indices[name], json_file_name)
+        for name, json_file_name, alias in get_schemes(config)
+    ]
+
+
+def get_indices(state: State, config: Settings) -> dict:
+    """Get names of the indices to write to.
+
+    While a rebuild is running these are new versions of the indices,
+    the aliases keep pointing to the previous ones.
+    """
+    return {
+        name: state.get(f"index_{name}") or alias
+        for name, json_file_name, alias in get_schemes(config)
+    }
+
+
+def switch_aliases(state: State, config: Settings, es: Any) -> NoReturn:
+    """Point the aliases to the rebuilt indices."""
+    for name, json_file_name, alias in get_schemes(config):
+        switch_alias(es, alias, state.get(f"index_{name}"))
+    state.set("rebuild", 0)
+
+
+def get_dead_letters() -> RedisDeadLetters:
+    """Get the store of bulk actions rejected by ES for good."""
+    storage, config, _ = get_storage()
+    return RedisDeadLetters(
+        storage.redis_adapter, config.dead_letter_key, config.dead_letter_size
+    )
+
+
+@lru_cache(maxsize=None)
+def get_es() -> elasticsearch.Elasticsearch:
+    """Get the ES client shared by all runs.
+
+    Its connections are kept alive between runs, the pool should fit
+    the bulk workers and the requests of index management.
+    """
+    config = Settings()
+    return elasticsearch.Elasticsearch([config.es_address], maxsize=config.es_pool_size)
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> tuple:
+    """Get storage and the singleton lease which fences it."""
+    config = Settings()
+    storage = RedisStorage(config)
+    lease = RedisLease(storage.redis_adapter, config.lease_key, config.lease_ttl)
+    storage.fence(lease)
+    return storage, config, lease
+
+
+def configuration(force: bool) -> tuple:
+    """Configure ETL."""
+    storage, config, lease = get_storage()
+    if not lease.held:
+        lease.wait(config.lease_retry)
+    state = State(storage)
+    shard_keys = []
+    if config.film_shards > 1:
+        shard_keys = [shard_state_key(shard) for shard in range(config.film_shards)]
+    track_state(state, storage.redis_adapter, shard_keys)
+
+    if force and state.get("in_progress") != "1":
+        state.clear()
+    elif force:
+        logger.info("Resuming unfinished rebuild from the saved checkpoints")
+    es = get_instance(state, config)
+    state.set("in_progress", 1)
+    # logger.info(f"Current state: {state}")
+
+    return config, state, es
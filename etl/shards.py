@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Coordination of film shards in Redis."""
+
+from typing import Any, NoReturn, Optional
+
+from config import logger
+from lease import RedisLease
+
+
+def shard_state_key(shard: int) -> str:
+    """Get the Redis key of the state of a films shard."""
+    return f"state:films:{shard}"
+
+
+class FilmShards:
+    """
+    Координация шардов фильмов через Redis. Главный процесс публикует
+    задание (поколение, индексы, режим пересборки), а воркеры берут
+    свободные шарды под аренду и отмечают выполненные.
+    """
+
+    def __init__(self, redis_adapter: Any, config: Any) -> NoReturn:
+        self.redis_adapter = redis_adapter
+        self.count = config.film_shards
+        self.lease_key = config.lease_key
+        self.lease_ttl = config.lease_ttl
+        self.key = f"{config.lease_key}:films"
+
+    def publish(self, indices: dict, rebuild: bool) -> dict:
+        """Publish a new job for all shards.
+
+        Done shards of the previous job are dropped, nobody needs them.
+        """
+        previous = self.job()
+        generation = str(self.redis_adapter.incr(f"{self.key}:generation"))
+        job = {
+            "generation": generation,
+            "films": indices["films"],
+            "persons": indices["persons"],
+            "rebuild": int(rebuild),
+            "shards": self.count,
+        }
+        self.redis_adapter.hset(f"{self.key}:job", mapping=job)
+        if previous:
+            self.redis_adapter.delete(self.done_key(previous))
+        logger.info(f"Published films job {generation} for {self.count} shards")
+        return self.job()
+
+    def job(self) -> Optional[dict]:
+        """Get the current job."""
+        return self.redis_adapter.hgetall(f"{self.key}:job") or None
+
+    def done_key(self, job: dict) -> str:
+        return f"{self.key}:done:{job['generation']}"
+
+    def claim(self, job: dict) -> Optional[tuple]:
+        """Take a lease on a shard of the job nobody works on."""
+        done_key = self.done_key(job)
+        for shard in range(int(job["shards"])):
+            if self.redis_adapter.sismember(done_key, shard):
+                continue
+            lease = RedisLease(
+                self.redis_adapter, f"{self.key}:{shard}", self.lease_ttl
+            )
+            if not lease.acquire():
+                continue
+            if self.redis_adapter.sismember(done_key, shard):
+                lease.release()
+                continue
+            return shard, lease
+        return None
+
+    def done(self, job: dict, shard: int) -> NoReturn:
+        """Mark the shard of the job as loaded, unless a new job replaced it."""
+        if self.redis_adapter.get(f"{self.key}:generation") == job["generation"]:
+            self.redis_adapter.sadd(self.done_key(job), shard)
+
+    def is_done(self, job: dict) -> bool:
+        """Check that all shards of the job are loaded."""
+        return self.redis_adapter.scard(self.done_key(job)) >= int(job["shards"])
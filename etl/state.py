@@ -5,6 +5,7 @@
 # @contact: ad3002@gmail.com
 """Loadind data from sqlite3 to postgres."""
 
+import threading
 from typing import Any, Iterator, NoReturn, Tuple
 
 from storage import BaseStorage, JsonFileStorage
@@ -21,26 +22,42 @@ class State:
         self.data = self.storage.retrieve_state()
         if self.data is None:
             self.data = {}
+        self.dirty = set()
+        self.lock = threading.RLock()
 
     def set(self, key: str, value: Any) -> NoReturn:
         """Установить состояние для определённого ключа"""
-        self.data[key] = value
-        self.storage.save_state(self.data)
+        self.update({key: value})
+
+    def update(self, values: dict) -> NoReturn:
+        """Установить состояние для нескольких ключей одной записью"""
+        with self.lock:
+            for key, value in values.items():
+                value = str(value)
+                if self.data.get(key) != value:
+                    self.data[key] = value
+                    self.dirty.add(key)
+            self.flush()
+
+    def flush(self) -> NoReturn:
+        """Записать в хранилище только изменённые ключи"""
+        with self.lock:
+            if self.dirty:
+                self.storage.save_fields({key: self.data[key] for key in self.dirty})
+                self.dirty.clear()
 
     def get(self, key: str) -> Any:
         """Получить состояние по определённому ключу"""
-        self.data = self.storage.retrieve_state()
-        if key in self.data:
-            return self.data[key]
-        return None
+        return self.data.get(key)
 
     def is_empty(self) -> bool:
         return len(self.data) == 0
 
     def __repr__(self) -> str:
-        self.data = self.storage.retrieve_state()
         return str(",".join([f"{k}: {v}" for k, v in self.data.items()]))
 
     def clear(self) -> NoReturn:
-        self.data = {}
-        self.storage.save_state(self.data)
+        with self.lock:
+            self.data = {}
+            self.dirty.clear()
+            self.storage.save_state(self.data)
@@ -8,10 +8,26 @@
 import abc
 import json
 import os
+import time
 from typing import Any, NoReturn, Optional
 
 import redis
 
+from backoff import backoff_decorator
+from lease import LeaseLostError, RedisLease
+
+FENCED_WRITE_SCRIPT = """
+if redis.call("get", KEYS[2]) ~= ARGV[1] then
+    return redis.error_reply("LEASE_LOST")
+end
+if #ARGV > 1 then
+    redis.call("hset", KEYS[1], unpack(ARGV, 2))
+else
+    redis.call("del", KEYS[1])
+end
+return 1
+"""
+
 
 class BaseStorage:
     @abc.abstractmethod
@@ -24,6 +40,11 @@ class BaseStorage:
         """Загрузить состояние локально из постоянного хранилища"""
         pass
 
+    @abc.abstractmethod
+    def save_fields(self, fields: dict) -> None:
+        """Сохранить изменённые ключи состояния одной транзакцией"""
+        pass
+
 
 class JsonFileStorage(BaseStorage):
     def __init__(self, file_path: Optional[str] = None):
@@ -41,20 +62,94 @@ class JsonFileStorage(BaseStorage):
         with open(self.file_path) as fh:
             return json.load(fh)
 
+    def save_fields(self, fields: dict) -> None:
+        """Сохранить изменённые ключи состояния одной транзакцией"""
+        state = self.retrieve_state()
+        state.update(fields)
+        self.save_state(state)
+
 
 class RedisStorage(BaseStorage):
-    def __init__(self, config: Any) -> NoReturn:
+    def __init__(self, config: Any, key: str = "state") -> NoReturn:
         self.redis_adapter = redis.Redis(
             **config.get_redis_dict(), decode_responses=True
         )
+        self.key = key
+        self.lease: Optional[RedisLease] = None
+        self.fenced_write = self.redis_adapter.register_script(FENCED_WRITE_SCRIPT)
+
+    def fence(self, lease: RedisLease) -> None:
+        """Write state only while the lease is held."""
+        self.lease = lease
 
+    def write_fenced(self, fields: dict) -> None:
+        """Write fields, or drop the state if there are none, under the lease."""
+        if not self.lease.held:
+            raise LeaseLostError(f"Lease ({self.lease.key}) is not held")
+        args = [self.lease.token]
+        for key, value in fields.items():
+            args.extend((key, value))
+        try:
+            self.fenced_write(keys=[self.key, self.lease.key], args=args)
+        except redis.exceptions.ResponseError as err:
+            if "LEASE_LOST" in str(err):
+                raise LeaseLostError(f"Lease ({self.lease.key}) is lost") from err
+            raise
+
+    @backoff_decorator(dependency="redis", giveup=(LeaseLostError,))
     def save_state(self, state: dict) -> None:
         """Сохранить состояние в постоянное хранилище"""
-        if not state:
-            self.redis_adapter.delete("state")
+        if self.lease is not None:
+            self.write_fenced(state)
+        elif not state:
+            self.redis_adapter.delete(self.key)
         else:
-            self.redis_adapter.hset("state", mapping=state)
+            self.redis_adapter.hset(self.key, mapping=state)
 
+    @backoff_decorator(dependency="redis")
     def retrieve_state(self) -> dict:
         """Загрузить состояние локально из постоянного хранилища"""
-        return self.redis_adapter.hgetall("state")
+        return self.redis_adapter.hgetall(self.key)
+
+    @backoff_decorator(dependency="redis", giveup=(LeaseLostError,))
+    def save_fields(self, fields: dict) -> None:
+        """Сохранить изменённые ключи состояния одной транзакцией"""
+        if self.lease is not None:
+            self.write_fenced(fields)
+            return
+        with self.redis_adapter.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key, mapping=fields)
+            pipe.execute()
+
+
+class RedisDeadLetters:
+    """
+    Действия, которые ES отверг окончательно. Хранятся в списке Redis,
+    чтобы их можно было разобрать и загрузить заново вручную.
+    Список ограничен `size` последними действиями.
+    """
+
+    def __init__(self, redis_adapter: Any, key: str, size: int) -> NoReturn:
+        self.redis_adapter = redis_adapter
+        self.key = key
+        self.size = size
+
+    def add(self, failed: list) -> NoReturn:
+        """Save (entry, item result) pairs of failed bulk actions."""
+        if not failed:
+            return
+        letters = [
+            json.dumps(
+                {
+                    "action": entry.decode(),
+                    "status": result.get("status"),
+                    "error": result.get("error"),
+                    "failed": time.time(),
+                }
+            )
+            for entry, result in failed
+        ]
+        with self.redis_adapter.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.key, *letters)
+            pipe.ltrim(self.key, -self.size, -1)
+            pipe.execute()
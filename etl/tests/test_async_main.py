@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Smoke test of the async engine pipelines against a fake bulk pool."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("asyncpg")
+elasticsearch = pytest.importorskip("elasticsearch")
+if not hasattr(elasticsearch, "AsyncElasticsearch"):
+    pytest.skip("AsyncElasticsearch is not installed", allow_module_level=True)
+
+import async_main
+from async_loaders import AsyncBulkLoader
+from queries import (query_films_by_ids, query_films_persons_by_person_ids,
+                     query_person_films_by_person_ids, query_tombstones)
+from state import State
+from storage import JsonFileStorage
+
+FILM = {
+    "id": "00000000-0000-0000-0000-0000000000f2",
+    "imdb_rating": 7.5,
+    "genres": ["Drama"],
+    "title": "Film",
+    "description": "",
+    "directors": [],
+    "directors_names": [],
+    "actors_names": [],
+    "writers_names": [],
+    "actors": [],
+    "writers": [],
+}
+TOMBSTONES = [
+    {
+        "id": "00000000-0000-0000-0000-000000000001",
+        "modified": "2026-10-18 10:00:00+00:00",
+        "table_name": "film_work",
+        "object_id": "00000000-0000-0000-0000-0000000000f1",
+        "film_work_id": None,
+        "person_id": None,
+    },
+    {
+        "id": "00000000-0000-0000-0000-000000000002",
+        "modified": "2026-10-18 10:00:01+00:00",
+        "table_name": "person_film_work",
+        "object_id": "00000000-0000-0000-0000-0000000000a1",
+        "film_work_id": FILM["id"],
+        "person_id": "00000000-0000-0000-0000-0000000000b1",
+    },
+]
+INDICES = {"films": "movies", "persons": "persons", "genres": "genres"}
+
+
+class FakePool:
+    """Bulk pool which keeps the actions instead of sending them to ES."""
+
+    def __init__(self):
+        self.size = SimpleNamespace(target=1 << 20)
+        self.max_actions = 1000
+        self.sent = []
+
+    async def submit(self, entries: list) -> asyncio.Future:
+        self.sent.extend(entries)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    def actions(self) -> list:
+        lines = [json.loads(line) for entry in self.sent for line in entry.splitlines()]
+        return [line for line in lines if set(line) & {"index", "update", "delete"}]
+
+
+@pytest.fixture
+def extractors(monkeypatch):
+    """Replace the asyncpg extractors with rows given by query."""
+    rows = {
+        query_tombstones: [TOMBSTONES],
+        query_films_by_ids: [[FILM]],
+        query_person_films_by_person_ids: [],
+        query_films_persons_by_person_ids: [[{**FILM, "actors_names": ["A"]}]],
+    }
+
+    async def bulk_extractor(name, config, query, *args, **kwargs):
+        for rows_batch in rows[query]:
+            yield rows_batch
+
+    async def related_extractor(config, query, ids, batch_size):
+        for rows_batch in rows[query]:
+            yield rows_batch
+
+    monkeypatch.setattr(async_main, "aiter_bulk_extractor", bulk_extractor)
+    monkeypatch.setattr(async_main, "aiter_related_extractor", related_extractor)
+
+
+@pytest.fixture
+def pruned(monkeypatch):
+    """Keep calls of tombstones pruning instead of running them."""
+    calls = []
+
+    async def prune_tombstones(config, state):
+        calls.append(state.get("last_bulk_extractor_tombstones_id"))
+
+    monkeypatch.setattr(async_main, "prune_tombstones", prune_tombstones)
+    return calls
+
+
+def test_load_deletes(extractors, pruned, tmp_path):
+    config = SimpleNamespace(batch_size=10, validate=True)
+    state = State(JsonFileStorage(str(tmp_path / "state.json")))
+    pool = FakePool()
+
+    asyncio.run(
+        async_main.load_deletes(config, state, AsyncBulkLoader(pool), INDICES)
+    )
+
+    actions = pool.actions()
+    assert {"delete": {"_index": "movies", "_id": TOMBSTONES[0]["object_id"]}} in (
+        actions
+    )
+    assert {"index": {"_index": "movies", "_id": FILM["id"]}} in actions
+    assert {"update": {"_index": "persons", "_id": TOMBSTONES[1]["person_id"]}} in (
+        actions
+    )
+    assert state.get("last_bulk_extractor_tombstones_id") == TOMBSTONES[1]["id"]
+    assert pruned == [TOMBSTONES[1]["id"]]
+
+
+def test_propagate_changes(extractors, tmp_path):
+    config = SimpleNamespace(batch_size=10, validate=True)
+    state = State(JsonFileStorage(str(tmp_path / "state.json")))
+    pool = FakePool()
+    person = {
+        "id": "00000000-0000-0000-0000-0000000000b1",
+        "modified": "2026-10-18 10:00:00+00:00",
+        "full_name": "A",
+    }
+
+    asyncio.run(
+        async_main.propagate_changes(
+            config, state, AsyncBulkLoader(pool), INDICES, "persons", [[person]]
+        )
+    )
+
+    assert pool.actions() == [{"update": {"_index": "movies", "_id": FILM["id"]}}]
+    assert state.get("last_bulk_extractor_persons_id") == person["id"]
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing retries and circuit breakers of the backoff decorator."""
+import asyncio
+import threading
+import time
+from typing import NoReturn
+
+import elasticsearch
+import pytest
+
+import backoff
+from backoff import BackoffFailException, CircuitBreaker, backoff_decorator
+
+OPTIONS = {"initial": 0.01, "max_timeout": 0.01}
+
+
+class LostLease(Exception):
+    pass
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """Breaker of a test dependency, opened by the first failure."""
+    breaker = CircuitBreaker("test", threshold=1, reset_timeout=0.2)
+    monkeypatch.setitem(backoff.BREAKERS, "test", breaker)
+    return breaker
+
+
+def open_circuit(breaker: CircuitBreaker) -> NoReturn:
+    breaker.failure()
+    time.sleep(breaker.reset_timeout)
+
+
+def test_breaker_opens_and_closes(breaker):
+    assert breaker.wait_time() == 0
+    breaker.failure()
+    assert 0 < breaker.wait_time() <= breaker.reset_timeout
+    time.sleep(breaker.reset_timeout)
+    assert breaker.wait_time("probe") == 0
+    assert breaker.wait_time("other") > 0
+    breaker.success()
+    assert breaker.wait_time("other") == 0
+
+
+def test_breaker_single_probe(breaker):
+    """Callers waiting for an open circuit don't call the dependency together."""
+    calls = []
+    probe_started = threading.Event()
+    finish_probe = threading.Event()
+
+    @backoff_decorator(dependency="test", **OPTIONS)
+    def call():
+        calls.append(time.monotonic())
+        probe_started.set()
+        finish_probe.wait()
+
+    open_circuit(breaker)
+    threads = [threading.Thread(target=call, daemon=True) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    try:
+        probe_started.wait(1)
+        time.sleep(0.3)
+        assert len(calls) == 1
+    finally:
+        finish_probe.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 20
+
+
+def test_nested_calls_go_through_the_probe(breaker):
+    """A call nested in the probe doesn't wait for the probe to end."""
+
+    @backoff_decorator(dependency="test", **OPTIONS)
+    def inner():
+        return "done"
+
+    @backoff_decorator(dependency="test", **OPTIONS)
+    def outer():
+        return inner()
+
+    open_circuit(breaker)
+    thread = threading.Thread(target=outer, daemon=True)
+    thread.start()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert breaker.opened_at is None
+    assert not backoff.probes.get()
+
+
+def test_giveup_releases_probe(breaker):
+    @backoff_decorator(dependency="test", giveup=(LostLease,), **OPTIONS)
+    def call():
+        raise LostLease("lease is lost")
+
+    open_circuit(breaker)
+    with pytest.raises(LostLease):
+        call()
+    assert not breaker.probing
+    assert breaker.wait_time() == 0
+
+
+def test_cancel_releases_probe(breaker):
+    @backoff_decorator(dependency="test", **OPTIONS)
+    async def call():
+        await asyncio.sleep(1)
+
+    async def cancel_call():
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.05)
+        assert breaker.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    open_circuit(breaker)
+    asyncio.run(cancel_call())
+    assert not breaker.probing
+
+
+def test_generator_retries_until_done():
+    attempts = []
+
+    @backoff_decorator(**OPTIONS)
+    def numbers():
+        attempts.append(1)
+        yield len(attempts)
+        if len(attempts) < 3:
+            raise ValueError("connection lost")
+
+    assert list(numbers()) == [1, 2, 3]
+
+
+def test_generator_gives_up():
+    @backoff_decorator(max_tries=2, **OPTIONS)
+    def numbers():
+        raise ValueError("connection lost")
+        yield
+
+    with pytest.raises(BackoffFailException):
+        list(numbers())
+
+
+def test_async_generator_retries_until_done():
+    attempts = []
+
+    @backoff_decorator(**OPTIONS)
+    async def numbers():
+        attempts.append(1)
+        yield len(attempts)
+        if len(attempts) < 3:
+            raise ValueError("connection lost")
+
+    async def collect():
+        return [number async for number in numbers()]
+
+    assert asyncio.run(collect()) == [1, 2, 3]
+
+
+def test_coroutine_retries():
+    attempts = []
+
+    @backoff_decorator(**OPTIONS)
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ValueError("connection lost")
+        return "done"
+
+    assert asyncio.run(call()) == "done"
+    assert len(attempts) == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        elasticsearch.TransportError(429, "es_rejected_execution_exception", {}),
+        elasticsearch.ConnectionError("N/A", "Connection refused", OSError()),
+    ],
+)
+def test_elasticsearch_errors_retried(breaker, error):
+    """ES errors carry non-string args, they are retried like the others."""
+    attempts = []
+    stats = backoff.retry_stats.copy()
+
+    @backoff_decorator(dependency="test", **OPTIONS)
+    def call():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise error
+        return "done"
+
+    assert call() == "done"
+    assert len(attempts) == 2
+    assert backoff.retry_stats[("test", "retries")] == stats[("test", "retries")] + 1
+
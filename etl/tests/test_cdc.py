@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing grouping of changes from the replication stream."""
+from cdc import group_changes, group_tombstones
+
+
+def column(name: str, value: str) -> dict:
+    return {"name": name, "type": "uuid", "value": value}
+
+
+def test_group_changes():
+    changes = [
+        {"action": "I", "table": "film_work", "columns": [column("id", "f1")]},
+        {"action": "U", "table": "person", "columns": [column("id", "p1")]},
+        {"action": "D", "table": "genre", "identity": [column("id", "g1")]},
+        {
+            "action": "D",
+            "table": "person_film_work",
+            "identity": [
+                column("id", "l1"),
+                column("film_work_id", "f2"),
+                column("person_id", "p2"),
+            ],
+        },
+    ]
+    grouped = group_changes(changes)
+    assert grouped["films"] == {"changed": {"f1", "f2"}, "deleted": set()}
+    assert grouped["persons"] == {"changed": {"p1"}, "deleted": set()}
+    assert grouped["genres"] == {"changed": set(), "deleted": {"g1"}}
+    assert grouped["filmography"] == {"p2"}
+
+
+def test_group_changes_deleted_wins():
+    changes = [
+        {"action": "U", "table": "person", "columns": [column("id", "p1")]},
+        {"action": "D", "table": "person", "identity": [column("id", "p1")]},
+        {
+            "action": "I",
+            "table": "person_film_work",
+            "columns": [column("film_work_id", "f1"), column("person_id", "p1")],
+        },
+    ]
+    grouped = group_changes(changes)
+    assert grouped["persons"] == {"changed": set(), "deleted": {"p1"}}
+    assert grouped["filmography"] == set()
+
+
+def test_group_changes_skips_truncates_and_messages():
+    changes = [
+        {"action": "T", "schema": "content", "table": "film_work"},
+        {"action": "M", "transactional": False, "prefix": "etl", "content": "x"},
+        {"action": "I", "table": "genre", "columns": [column("id", "g1")]},
+    ]
+    grouped = group_changes(changes)
+    assert grouped["genres"]["changed"] == {"g1"}
+    assert grouped["films"] == {"changed": set(), "deleted": set()}
+
+
+def test_group_changes_keeps_tombstones_apart():
+    changes = [
+        {
+            "action": "I",
+            "table": "tombstone",
+            "columns": [
+                column("id", "t1"),
+                column("object_id", "g1"),
+                column("film_work_id", None),
+            ],
+        },
+        {"action": "D", "table": "tombstone", "identity": [column("id", "t0")]},
+        {"action": "D", "table": "genre", "identity": [column("id", "g1")]},
+    ]
+    grouped = group_changes(changes)
+    assert grouped["tombstones"] == {"t1"}
+    assert grouped["genres"] == {"changed": set(), "deleted": {"g1"}}
+    assert grouped["films"] == {"changed": set(), "deleted": set()}
+
+
+def test_group_tombstones():
+    rows = [
+        {
+            "table_name": "genre_film_work",
+            "object_id": "l1",
+            "film_work_id": "f1",
+            "person_id": None,
+        },
+        {
+            "table_name": "film_work",
+            "object_id": "f2",
+            "film_work_id": None,
+            "person_id": None,
+        },
+    ]
+    grouped = group_tombstones(rows)
+    assert grouped["films"] == {"changed": {"f1"}, "deleted": {"f2"}}
+    assert grouped["filmography"] == set()
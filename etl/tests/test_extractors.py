@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing checkpoints of the extractors."""
+from extractors import (DEFAULT_ID, DEFAULT_MODIFIED, get_checkpoint,
+                        save_checkpoint)
+from state import State
+from storage import JsonFileStorage
+
+PERSON_ID = "00000000-0000-0000-0000-0000000000b1"
+
+
+def make_state(tmp_path) -> State:
+    return State(JsonFileStorage(str(tmp_path / "state.json")))
+
+
+def test_overlap_moves_modified_checkpoint_back(tmp_path):
+    state = make_state(tmp_path)
+    save_checkpoint(
+        state, "films", [{"id": PERSON_ID, "modified": "2026-10-18 10:01:00+00:00"}]
+    )
+    checkpoint = get_checkpoint(state, "films", overlap=60)
+    assert checkpoint == {"modified": "2026-10-18 10:00:00+00:00", "id": DEFAULT_ID}
+
+
+def test_overlap_keeps_id_only_checkpoint(tmp_path):
+    state = make_state(tmp_path)
+    state.update({"last_bulk_extractor_filmography": DEFAULT_MODIFIED})
+    save_checkpoint(state, "filmography", [{"id": PERSON_ID, "role": "actor"}])
+    checkpoint = get_checkpoint(state, "filmography", overlap=60)
+    assert checkpoint == {"modified": DEFAULT_MODIFIED, "id": PERSON_ID}
+
+
+def test_checkpoint_never_moves_back(tmp_path):
+    state = make_state(tmp_path)
+    row = {"id": PERSON_ID, "modified": "2026-10-18 10:01:00+00:00"}
+    save_checkpoint(state, "persons", [row])
+    save_checkpoint(state, "persons", [dict(row, modified="2026-10-18 10:00:30")])
+    assert get_checkpoint(state, "persons")["modified"] == row["modified"]
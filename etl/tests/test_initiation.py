@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing index settings of full loads."""
+from pathlib import Path
+from types import SimpleNamespace
+
+from initiation import BULK_LOAD_SETTINGS, bulk_load_settings
+
+SCHEMA = str(Path(__file__).resolve().parent.parent / "index_schema_films.json")
+
+
+class FakeIndices:
+    def __init__(self):
+        self.settings = {}
+        self.refreshed = []
+
+    def put_settings(self, index: str, body: dict) -> dict:
+        self.settings[index] = body["index"]
+        return {}
+
+    def refresh(self, index: str) -> dict:
+        self.refreshed.append(index)
+        return {}
+
+
+def test_schema_settings_restored():
+    es = SimpleNamespace(indices=FakeIndices())
+    # A killed rebuild left the bulk load settings on the index.
+    es.indices.settings["movies_v2"] = BULK_LOAD_SETTINGS
+
+    with bulk_load_settings(es, [("movies_v2", SCHEMA)]):
+        assert es.indices.settings["movies_v2"] == BULK_LOAD_SETTINGS
+
+    assert es.indices.settings["movies_v2"] == {
+        "refresh_interval": "1s",
+        "number_of_replicas": None,
+    }
+    assert es.indices.refreshed == ["movies_v2"]
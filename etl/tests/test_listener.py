@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing reconnects of the listener of notifications."""
+from types import SimpleNamespace
+
+import psycopg2
+
+import listener
+
+
+class FakeConnection:
+    def __init__(self):
+        self.listened = []
+        self.closed = False
+        self.notifies = []
+
+    def set_isolation_level(self, level: int):
+        pass
+
+    def cursor(self):
+        return SimpleNamespace(execute=self.listened.append)
+
+    def close(self):
+        self.closed = True
+
+
+def test_listen_again_after_lost_connection(monkeypatch):
+    connections = []
+
+    def connect(config):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    def select(rlist, wlist, xlist, timeout):
+        if len(connections) == 1:
+            raise psycopg2.OperationalError("server closed the connection")
+        return [], [], []
+
+    monkeypatch.setattr(listener, "connect", connect)
+    monkeypatch.setattr(listener.select, "select", select)
+    config = SimpleNamespace(
+        listen_channel="etl", listen_debounce=10, listen_max_delay=100, listen_idle=1
+    )
+
+    changes = listener.iter_changes(config)
+    assert next(changes) == []
+    assert next(changes) == []
+    assert len(connections) == 2
+    assert connections[0].closed
+    assert connections[1].listened == ["LISTEN etl;"]
+    changes.close()
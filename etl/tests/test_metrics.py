@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# @created: 18.10.2026
+# @author: Aleksey Komissarov
+# @contact: ad3002@gmail.com
+"""Testing metrics of the lag and of loaded rows."""
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from config import DEFAULT_MODIFIED
+from loaders import BulkLoader
+from metrics import StateCollector
+
+
+class FakeRedis:
+    def __init__(self, hashes: dict):
+        self.hashes = hashes
+
+    def hget(self, key: str, field: str):
+        return self.hashes.get(key, {}).get(field)
+
+
+class FakePool:
+    """Bulk pool which finishes requests when told to."""
+
+    def __init__(self):
+        self.size = SimpleNamespace(target=1 << 20)
+        self.max_actions = 2
+        self.futures = []
+
+    def submit(self, entries: list) -> Future:
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+def lag_of(collector: StateCollector) -> dict:
+    lag = next(collector.collect())
+    return {sample.labels["entity"]: sample.value for sample in lag.samples}
+
+
+def ago(seconds: int) -> str:
+    return str(datetime.now(timezone.utc) - timedelta(seconds=seconds))
+
+
+def test_lag_of_state():
+    collector = StateCollector()
+    collector.state = {"last_bulk_extractor_persons": ago(60)}
+    lag = lag_of(collector)
+    assert set(lag) == {"persons"}
+    assert 60 <= lag["persons"] < 70
+
+
+def test_no_lag_before_the_first_row():
+    collector = StateCollector()
+    collector.state = {
+        "last_bulk_extractor_tombstones": DEFAULT_MODIFIED,
+        "last_bulk_extractor_genres": ago(5),
+    }
+    assert set(lag_of(collector)) == {"genres"}
+
+
+def test_films_lag_of_the_slowest_shard():
+    collector = StateCollector()
+    collector.state = {"last_bulk_extractor_films": ago(1000)}
+    collector.redis_adapter = FakeRedis(
+        {
+            "state:films:0": {"last_bulk_extractor_films": ago(30)},
+            "state:films:1": {"last_bulk_extractor_films": ago(120)},
+            "state:films:2": {},
+        }
+    )
+    collector.shard_keys = ("state:films:0", "state:films:1", "state:films:2")
+    assert 120 <= lag_of(collector)["films"] < 130
+
+
+def test_loaded_counted_when_in_es():
+    def loaded() -> float:
+        value = REGISTRY.get_sample_value(
+            "etl_rows_total", {"entity": "film_persons", "stage": "loaded"}
+        )
+        return value or 0
+
+    before = loaded()
+    pool = FakePool()
+    loader = BulkLoader(pool)
+    loader.load([b"1", b"2", b"3"], "film_persons")
+    assert loaded() == before
+
+    pool.futures[0].set_result(None)
+    loader.collect()
+    assert loaded() == before
+    loader.flush()
+    pool.futures[1].set_result(None)
+    loader.collect()
+    assert loaded() == before + 3
@@ -4,117 +4,201 @@
 # @author: Aleksey Komissarov
 # @contact: ad3002@gmail.com
 
-from config import Settings
-from models import GenreModel, MovieModel, PersonModel
+from itertools import groupby
+from operator import itemgetter
+from typing import NoReturn, Optional
 
-settings = Settings()
+from loaders import encode_line
+from metrics import count_rows
+from models import (FilmGenresModel, FilmPersonsModel, GenreModel, MovieModel,
+                    PersonModel)
 
+FILM_FIELDS = (
+    "imdb_rating",
+    "genres",
+    "title",
+    "description",
+    "directors",
+    "directors_names",
+    "actors_names",
+    "writers_names",
+    "actors",
+    "writers",
+)
+FILM_PERSONS_FIELDS = (
+    "directors",
+    "directors_names",
+    "actors_names",
+    "writers_names",
+    "actors",
+    "writers",
+)
+FILM_GENRES_FIELDS = ("genres",)
+GENRE_FIELDS = ("name", "description")
+PERSON_FIELDS = ("full_name",)
+PERSON_DEFAULTS = {"is_actor": False, "is_director": False, "is_writer": False}
+FILM_ROLES = ("actor", "director", "writer")
 
-def transformer_films(row: dict) -> list:
-    """Data transformer."""
-    data = MovieModel(**row)
-    index_template = {
-        "index": {
-            "_index": settings.es_scheme_films,
-            "_id": str(data.id),
-        }
-    }
-    data_template = {
-        "id": str(data.id),
-        "imdb_rating": data.imdb_rating,
-        "genres": data.genres,
-        "title": data.title,
-        "description": data.description,
-        "directors": data.directors,
-        "directors_names": data.directors_names,
-        "actors_names": data.actors_names,
-        "writers_names": data.writers_names,
-        "actors": data.actors,
-        "writers": data.writers,
-    }
-    return [index_template, data_template]
 
+def encode_index(
+    row: dict, index_name: str, fields: tuple, defaults: Optional[dict] = None
+) -> bytes:
+    """Encode row to an index action."""
+    _id = str(row["id"])
+    source = {"id": _id}
+    for field in fields:
+        source[field] = row[field]
+    source.update(defaults or {})
+    return encode_line({"index": {"_index": index_name, "_id": _id}}) + encode_line(
+        source
+    )
 
-def transformer_genres(row: dict) -> list:
-    """Data transformer."""
-    data = GenreModel(**row)
-    index_template = {
-        "index": {
-            "_index": settings.es_scheme_genres,
-            "_id": str(data.id),
-        }
-    }
-    data_template = {
-        "id": str(data.id),
-        "name": data.name,
-        "description": data.description,
-    }
-    return [index_template, data_template]
 
+def encode_update(row: dict, index_name: str, fields: tuple) -> bytes:
+    """Encode row to a partial update action."""
+    meta = {"update": {"_index": index_name, "_id": str(row["id"])}}
+    doc = {"doc": {field: row[field] for field in fields}}
+    return encode_line(meta) + encode_line(doc)
 
-def transformer_persons(row: dict) -> list:
-    """Data transformer."""
-    data = PersonModel(**row)
-    index_template = {
-        "index": {
-            "_index": settings.es_scheme_persons,
-            "_id": str(data.id),
-        }
-    }
-    data_template = {
-        "id": str(data.id),
-        "full_name": data.full_name,
-        "is_actor": False,
-        "is_director": False,
-        "is_writer": False,
+
+def encode_delete(_id: str, index_name: str) -> bytes:
+    """Encode id to a delete action, it has no source line."""
+    return encode_line({"delete": {"_index": index_name, "_id": str(_id)}})
+
+
+def encode_upsert(
+    row: dict, index_name: str, fields: tuple, defaults: Optional[dict] = None
+) -> bytes:
+    """Encode row to an update action, which keeps other fields of the doc."""
+    _id = str(row["id"])
+    doc = {"id": _id}
+    for field in fields:
+        doc[field] = row[field]
+    upsert = {**doc, **(defaults or {})}
+    meta = {"update": {"_index": index_name, "_id": _id}}
+    return encode_line(meta) + encode_line({"doc": doc, "upsert": upsert})
+
+
+def encode_filmography(person_id: str, rows: list, index_name: str) -> bytes:
+    """Encode films of a person grouped by role to an update action."""
+    films = {role: [] for role in FILM_ROLES}
+    for row in rows:
+        if row["role"] in films:
+            films[row["role"]].append(str(row["film_work_id"]))
+    doc = {
+        "films": films,
+        "films_count": {role: len(film_ids) for role, film_ids in films.items()},
+        "is_actor": bool(films["actor"]),
+        "is_director": bool(films["director"]),
+        "is_writer": bool(films["writer"]),
     }
-    return [index_template, data_template]
-
-
-def transformer_people_roles(row: dict) -> list:
-    """Data transformer from film to people roles."""
-    data = MovieModel(**row)
-    result = []
-    for someone in data.actors:
-        index_template = {
-            "update": {
-                "_index": settings.es_scheme_persons,
-                "_id": str(someone["id"]),
-            }
-        }
-        data_template = {
-            "doc": {
-                "is_actor": True,
-            }
-        }
-        result.append(index_template)
-        result.append(data_template)
-    for someone in data.writers:
-        index_template = {
-            "update": {
-                "_index": settings.es_scheme_persons,
-                "_id": str(someone["id"]),
-            }
-        }
-        data_template = {
-            "doc": {
-                "is_writer": True,
-            }
-        }
-        result.append(index_template)
-        result.append(data_template)
-    for someone in data.directors:
-        index_template = {
-            "update": {
-                "_index": settings.es_scheme_persons,
-                "_id": str(someone["id"]),
-            }
-        }
-        data_template = {
-            "doc": {
-                "is_director": True,
-            }
-        }
-        result.append(index_template)
-        result.append(data_template)
-    return result
+    doc["films_count"]["total"] = len({row["film_work_id"] for row in rows})
+    meta = {"update": {"_index": index_name, "_id": str(person_id)}}
+    return encode_line(meta) + encode_line({"doc": doc})
+
+
+class PeopleRoles:
+    """
+    Персоны из загруженных фильмов. Каждая персона берётся один раз
+    за время работы ETL, чтобы её фильмография и роли обновлялись
+    одним действием, а не по действию на каждый фильм.
+    """
+
+    ROLE_FIELDS = ("actors", "writers", "directors")
+
+    def __init__(self) -> NoReturn:
+        self.seen = set()
+        self.new = []
+
+    def add(self, row: dict) -> NoReturn:
+        """Collect people of the film."""
+        for field in self.ROLE_FIELDS:
+            for someone in row[field]:
+                person_id = str(someone["id"])
+                if person_id not in self.seen:
+                    self.seen.add(person_id)
+                    self.new.append(person_id)
+
+    def pop_new(self) -> list:
+        """Get people collected since the last call."""
+        new, self.new = self.new, []
+        return new
+
+
+MODELS = {
+    "films": MovieModel,
+    "genres": GenreModel,
+    "persons": PersonModel,
+    "film_persons": FilmPersonsModel,
+    "film_genres": FilmGenresModel,
+}
+
+ENCODERS = {
+    "films": lambda row, index_name: encode_index(row, index_name, FILM_FIELDS),
+    "genres": lambda row, index_name: encode_index(row, index_name, GENRE_FIELDS),
+    "persons": lambda row, index_name: encode_upsert(
+        row, index_name, PERSON_FIELDS, PERSON_DEFAULTS
+    ),
+    "film_persons": lambda row, index_name: encode_update(
+        row, index_name, FILM_PERSONS_FIELDS
+    ),
+    "film_genres": lambda row, index_name: encode_update(
+        row, index_name, FILM_GENRES_FIELDS
+    ),
+}
+
+
+def validate_rows(name: str, rows: list, validate: bool) -> list:
+    """Parse rows with pydantic models in the validating mode.
+
+    Otherwise rows are used as they come from DB, NULLs are expected
+    to be replaced with defaults in SQL already.
+    """
+    if validate and name in MODELS:
+        model = MODELS[name]
+        return [model(**row).dict() for row in rows]
+    return rows
+
+
+def transform_rows(name: str, rows: list, index_name: str, validate: bool) -> list:
+    """Transform rows to encoded bulk actions."""
+    encoder = ENCODERS[name]
+    entries = [encoder(row, index_name) for row in validate_rows(name, rows, validate)]
+    count_rows(name, "transformed", len(entries))
+    return entries
+
+
+def transform_films(
+    rows: list,
+    index_name: str,
+    people_roles: Optional[PeopleRoles],
+    validate: bool,
+) -> list:
+    """Transform films rows to films actions, collect people of the films.
+
+    Each row is parsed once for both.
+    """
+    films_entries = []
+    for row in validate_rows("films", rows, validate):
+        films_entries.append(encode_index(row, index_name, FILM_FIELDS))
+        if people_roles is not None:
+            people_roles.add(row)
+    count_rows("films", "transformed", len(films_entries))
+    return films_entries
+
+
+def transform_filmography(rows: list, index_name: str) -> list:
+    """Transform person films rows ordered by person to updates of persons."""
+    entries = [
+        encode_filmography(person_id, list(person_rows), index_name)
+        for person_id, person_rows in groupby(rows, key=itemgetter("id"))
+    ]
+    count_rows("filmography", "transformed", len(entries))
+    return entries
+
+
+def transform_deletes(ids: list, index_name: str) -> list:
+    """Transform ids of deleted rows to delete actions."""
+    entries = [encode_delete(_id, index_name) for _id in ids]
+    count_rows("deletes", "transformed", len(entries))
+    return entries
@@ -50,7 +50,89 @@ CREATE TABLE IF NOT EXISTS content.genre_film_work (
 );
 
 CREATE INDEX IF NOT EXISTS film_work_creation_date_idx ON content.film_work (creation_date);
+CREATE INDEX IF NOT EXISTS film_work_modified_idx ON content.film_work (modified);
+CREATE INDEX IF NOT EXISTS person_modified_idx ON content.person (modified);
+CREATE INDEX IF NOT EXISTS genre_modified_idx ON content.genre (modified);
+CREATE INDEX IF NOT EXISTS person_film_work_person_idx ON content.person_film_work (person_id);
+CREATE INDEX IF NOT EXISTS genre_film_work_genre_idx ON content.genre_film_work (genre_id);
+CREATE INDEX IF NOT EXISTS person_film_work_created_idx ON content.person_film_work (created, film_work_id);
+CREATE INDEX IF NOT EXISTS genre_film_work_created_idx ON content.genre_film_work (created, film_work_id);
 
 CREATE UNIQUE INDEX IF NOT EXISTS film_work_person_idx ON content.person_film_work (film_work_id, person_id, role);
 CREATE UNIQUE INDEX IF NOT EXISTS genre_name_idx ON content.genre (name);
 
+
+CREATE OR REPLACE FUNCTION content.notify_etl_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb := to_jsonb(COALESCE(NEW, OLD));
+BEGIN
+    PERFORM pg_notify('etl_changes', jsonb_strip_nulls(jsonb_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', changed->'id',
+        'film_work_id', changed->'film_work_id'
+    ))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS film_work_notify_etl ON content.film_work;
+CREATE TRIGGER film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS person_notify_etl ON content.person;
+CREATE TRIGGER person_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.person
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS genre_notify_etl ON content.genre;
+CREATE TRIGGER genre_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.genre
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS person_film_work_notify_etl ON content.person_film_work;
+CREATE TRIGGER person_film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.person_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+DROP TRIGGER IF EXISTS genre_film_work_notify_etl ON content.genre_film_work;
+CREATE TRIGGER genre_film_work_notify_etl AFTER INSERT OR UPDATE OR DELETE ON content.genre_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change();
+
+ALTER TABLE content.person_film_work REPLICA IDENTITY FULL;
+ALTER TABLE content.genre_film_work REPLICA IDENTITY FULL;
+
+CREATE TABLE IF NOT EXISTS content.tombstone (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    table_name text NOT NULL,
+    object_id uuid NOT NULL,
+    film_work_id uuid,
+    person_id uuid,
+    deleted timestamp with time zone NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS tombstone_deleted_idx ON content.tombstone (deleted, id);
+
+CREATE OR REPLACE FUNCTION content.record_tombstone() RETURNS trigger AS $$
+DECLARE
+    deleted_row jsonb := to_jsonb(OLD);
+BEGIN
+    INSERT INTO content.tombstone (table_name, object_id, film_work_id, person_id)
+    VALUES (
+        TG_TABLE_NAME,
+        OLD.id,
+        (deleted_row->>'film_work_id')::uuid,
+        (deleted_row->>'person_id')::uuid
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS film_work_tombstone ON content.film_work;
+CREATE TRIGGER film_work_tombstone AFTER DELETE ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS person_tombstone ON content.person;
+CREATE TRIGGER person_tombstone AFTER DELETE ON content.person
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS genre_tombstone ON content.genre;
+CREATE TRIGGER genre_tombstone AFTER DELETE ON content.genre
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS person_film_work_tombstone ON content.person_film_work;
+CREATE TRIGGER person_film_work_tombstone AFTER DELETE ON content.person_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();
+DROP TRIGGER IF EXISTS genre_film_work_tombstone ON content.genre_film_work;
+CREATE TRIGGER genre_film_work_tombstone AFTER DELETE ON content.genre_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.record_tombstone();